@@ -0,0 +1,97 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from scrapeExchangeRates import RateAnalytics, RateRecords, derive_cross_rates
+
+def anchor_frame(currencies, start_year, years, anchor='USD', seed=0):
+    """
+    Random-walk monthly anchor/X rates with a few missing months, as a tidy frame
+    """
+    rng = np.random.default_rng(seed)
+    records = RateRecords()
+    rows = []
+    for currency in currencies:
+        level = rng.uniform(0.5, 150)
+        for year in range(start_year, start_year + years):
+            for month in range(1, 13):
+                level *= 1 + rng.normal(0, 0.02)
+                if rng.random() >= 0.02:
+                    rows.append((anchor, currency, year, month, round(level, 6)))
+    records.add_rows(rows)
+    return records.to_frame()
+
+def reference(group, window, volatility_window):
+    """
+    The same figures for one pair with a per-pair pandas Series, the slow way
+    """
+    periods = pd.PeriodIndex.from_fields(year=group['year'].astype(int), month=group['month'].cat.codes + 1, freq='M')
+    rates = pd.Series(group['rate'].to_numpy(), index=periods)
+    rates = rates.reindex(pd.period_range(periods.min(), periods.max(), freq='M'))
+    changes = np.log(rates / rates.shift(1))
+    monthly = pd.DataFrame({
+        'mom_pct': (rates / rates.shift(1) - 1) * 100,
+        'yoy_pct': (rates / rates.shift(12) - 1) * 100,
+        f'rolling_mean_{window}m': rates.rolling(window).mean(),
+        f'volatility_{volatility_window}m_pct': changes.rolling(volatility_window).std() * np.sqrt(12) * 100,
+        'annual_mean': rates.groupby(rates.index.year).transform('mean'),
+    })
+    return monthly.loc[periods]
+
+def main():
+    parser = argparse.ArgumentParser(description='Time RateAnalytics on derived cross rates and check it against per-pair pandas')
+    parser.add_argument('--currencies', type=int, default=150,
+                       help='Currencies scraped against the anchor; all cross pairs are analysed (default: 150)')
+    parser.add_argument('--start-year', type=int, default=1995,
+                       help='First year (default: 1995)')
+    parser.add_argument('--years', type=int, default=30,
+                       help='Years per pair (default: 30)')
+    parser.add_argument('--reference-pairs', type=int, default=200,
+                       help='Pairs recomputed per pair with pandas for the check (default: 200)')
+    args = parser.parse_args()
+
+    currencies = [f"C{i:03d}" for i in range(args.currencies)]
+    tidy = derive_cross_rates(anchor_frame(currencies, args.start_year, args.years), 'USD', currencies)
+    pairs = tidy['pair'].cat.categories
+    print(f"Tidy frame: {len(tidy)} rows, {len(pairs)} pairs\n")
+
+    started = time.perf_counter()
+    analytics = RateAnalytics.for_frame(tidy)
+    hashed = time.perf_counter() - started
+    started = time.perf_counter()
+    monthly = analytics.monthly
+    annual = analytics.annual
+    computed = time.perf_counter() - started
+    started = time.perf_counter()
+    memoized = RateAnalytics.for_frame(tidy.copy())
+    lookup = time.perf_counter() - started
+
+    print(f"{'dataset hash':<32} {hashed * 1000:10.1f} ms")
+    print(f"{'monthly + annual figures':<32} {computed * 1000:10.1f} ms  ({len(monthly)} + {len(annual)} rows)")
+    print(f"{'memoized lookup':<32} {lookup * 1000:10.1f} ms  ({'same' if memoized is analytics else 'new'} instance)")
+
+    sample = list(pairs[::max(1, len(pairs) // args.reference_pairs)][:args.reference_pairs])
+    subset = monthly[monthly['pair'].isin(sample)]
+    columns = list(monthly.columns[-5:])
+    worst = 0.0
+    started = time.perf_counter()
+    expected = {pair: reference(group, analytics.window, analytics.volatility_window)
+                for pair, group in subset.groupby('pair', observed=True)}
+    per_pair = (time.perf_counter() - started) / len(sample)
+    for pair, group in subset.groupby('pair', observed=True):
+        got, want = group[columns].to_numpy(), expected[pair][columns].to_numpy()
+        if not (np.isnan(got) == np.isnan(want)).all():
+            worst = np.inf
+            continue
+        known = ~np.isnan(want)
+        if known.any():
+            worst = max(worst, float(np.max(np.abs(got[known] - want[known]) / np.maximum(np.abs(want[known]), 1e-12))))
+
+    print(f"{'per-pair pandas, extrapolated':<32} {per_pair * len(pairs) * 1000:10.1f} ms  "
+          f"({per_pair * 1000:.2f} ms x {len(pairs)} pairs)")
+    print(f"\n{'✓' if worst < 1e-9 else '✗'} {len(sample)} pairs match per-pair pandas, max relative error {worst:.1e}")
+
+if __name__ == "__main__":
+    main()
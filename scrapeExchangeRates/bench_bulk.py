@@ -0,0 +1,132 @@
+import argparse
+import contextlib
+import io
+import os
+import random
+import tempfile
+import time
+import zipfile
+from datetime import date, timedelta
+
+from bench_parse import sample_page
+from bench_suite import FixtureServer, FixtureStore
+from scrapeExchangeRates import MONTH_ORDER, BulkFileSource, RateLimiter, XRatesScraper
+
+def daily_history(start_year, years, currencies, seed=0):
+    """
+    Random-walk weekday rates per 1 unit of the base currency, with a few
+    missing quotes, as [(date, {currency: rate or None})]
+    """
+    rnd = random.Random(seed)
+    levels = {currency: rnd.uniform(0.5, 150) for currency in currencies}
+    history = []
+    day = date(start_year, 1, 1)
+    while day.year < start_year + years:
+        if day.weekday() < 5:
+            quotes = {}
+            for currency in currencies:
+                levels[currency] *= 1 + rnd.gauss(0, 0.004)
+                quotes[currency] = None if rnd.random() < 0.01 else round(levels[currency], 4)
+            history.append((day, quotes))
+        day += timedelta(days=1)
+    return history
+
+def write_bulk_fixture(path, history, currencies, file_format):
+    """
+    Write history as an ECB style wide CSV, Cube XML, or a ZIP holding the CSV
+    """
+    if file_format == 'xml':
+        days = "".join(
+            f'<Cube time="{day}">' + "".join(f'<Cube currency="{currency}" rate="{rate}"/>'
+                                             for currency, rate in quotes.items() if rate is not None) + '</Cube>'
+            for day, quotes in reversed(history))
+        body = ('<?xml version="1.0" encoding="UTF-8"?><gesmes:Envelope xmlns:gesmes="http://www.gesmes.org/xml/2002-08-01" '
+                f'xmlns="http://www.ecb.int/vocabulary/2002-08-01/eurofxref"><Cube>{days}</Cube></gesmes:Envelope>')
+    else:
+        lines = ["Date," + ",".join(currencies) + ","]
+        lines += [f"{day}," + ",".join("N/A" if quotes[c] is None else str(quotes[c]) for c in currencies) + ","
+                  for day, quotes in reversed(history)]
+        body = "\n".join(lines) + "\n"
+
+    if file_format == 'zip':
+        with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr('eurofxref-hist.csv', body)
+    else:
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(body)
+
+def expected_averages(history, from_currency, to_currency, base):
+    """
+    Monthly averages of the daily cross rate, computed the slow way
+    """
+    sums = {}
+    for day, quotes in history:
+        quotes = {**quotes, base: 1.0}
+        if quotes.get(from_currency) is None or quotes.get(to_currency) is None:
+            continue
+        total, count = sums.get((day.year, day.month), (0.0, 0))
+        sums[(day.year, day.month)] = (total + quotes[to_currency] / quotes[from_currency], count + 1)
+    averages = {}
+    for (year, month), (total, count) in sums.items():
+        averages.setdefault(year, {})[MONTH_ORDER[month - 1]] = round(total / count, 6)
+    return averages
+
+def main():
+    parser = argparse.ArgumentParser(description='Check and time BulkFileSource against local fixture files')
+    parser.add_argument('--start-year', type=int, default=1999,
+                       help='First year in the fixture (default: 1999)')
+    parser.add_argument('--years', type=int, default=25,
+                       help='Years of daily history (default: 25)')
+    parser.add_argument('--from-currency', default='USD',
+                       help='Source currency (default: USD)')
+    parser.add_argument('--to-currency', default='INR',
+                       help='Target currency (default: INR)')
+    args = parser.parse_args()
+
+    currencies = ['USD', 'INR', 'GBP', 'JPY', 'CHF']
+    base = 'EUR'
+    history = daily_history(args.start_year, args.years, currencies)
+    end_year = args.start_year + args.years - 1
+    expected = expected_averages(history, args.from_currency, args.to_currency, base)
+    frames = {}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for file_format in ('csv', 'xml', 'zip'):
+            path = os.path.join(tmp, f'history.{file_format}')
+            write_bulk_fixture(path, history, currencies, file_format)
+            timings = []
+            # Best of three, each with a fresh source so the file is read and parsed every time
+            for _ in range(3):
+                scraper = XRatesScraper(source=BulkFileSource(path, base))
+                with contextlib.redirect_stdout(io.StringIO()):
+                    started = time.perf_counter()
+                    frames[file_format] = scraper.scrape_multiple_years(args.start_year, end_year,
+                                                                        args.from_currency, args.to_currency)
+                    timings.append(time.perf_counter() - started)
+            print(f"bulk {file_format:<4} {os.path.getsize(path) / 1024:8.1f} KiB  {min(timings) * 1000:8.1f} ms")
+
+    bulk = frames['csv']
+    for file_format, df in frames.items():
+        if not df.equals(bulk):
+            print(f"✗ {file_format} frame differs from csv")
+    mismatches = sum(1 for year, year_data in expected.items() for month, rate in year_data.items()
+                     if bulk.at[month, year] != rate)
+    print(f"{'✓' if not mismatches else '✗'} {mismatches} monthly averages differ from the reference computation")
+
+    # Serve the same averages as x-rates pages and scrape them year by year
+    store = FixtureStore()
+    for year, year_data in expected.items():
+        store.pages[(args.from_currency, args.to_currency, year)] = sample_page(
+            year, args.from_currency, args.to_currency, rates=year_data)
+    with FixtureServer(store) as server:
+        scraper = XRatesScraper(server.base_url, rate_limiter=RateLimiter(1000, 1000))
+        with contextlib.redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            pages = scraper.scrape_multiple_years(args.start_year, end_year, args.from_currency, args.to_currency)
+            elapsed = time.perf_counter() - started
+    print(f"pages     {len(expected):>4} requests  {elapsed * 1000:8.1f} ms")
+    print(f"{'✓' if pages.equals(bulk) else '✗'} bulk frame {'matches' if pages.equals(bulk) else 'differs from'} "
+          f"scrape_multiple_years over pages, shape {bulk.shape}")
+
+if __name__ == "__main__":
+    main()
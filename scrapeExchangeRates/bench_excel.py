@@ -0,0 +1,83 @@
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from scrapeExchangeRates import MONTH_ORDER, XRatesScraper, excel_styles
+
+def sample_frames(pairs=100, years=30, start_year=1995):
+    """
+    Build a tidy frame and a wide (pair, month) x year matrix of random rates
+    """
+    rng = np.random.default_rng(0)
+    pair_names = [f"C{i:03d}/USD" for i in range(pairs)]
+    tidy = pd.DataFrame({
+        'pair': np.repeat(pair_names, years * 12),
+        'year': np.tile(np.repeat(np.arange(start_year, start_year + years), 12), pairs),
+        'month': np.tile(MONTH_ORDER, pairs * years),
+        'rate': rng.uniform(0.01, 150, pairs * years * 12),
+    })
+    wide = tidy.assign(row=tidy['pair'] + ' ' + tidy['month']).pivot(index='row', columns='year', values='rate')
+    return tidy, wide
+
+def legacy_save_to_excel(df, filename):
+    """
+    The per-cell export save_to_excel used before, kept for comparison
+    """
+    with pd.ExcelWriter(filename, engine='openpyxl') as writer:
+        df.to_excel(writer, sheet_name='Exchange Rates', index_label='Month')
+        worksheet = writer.sheets['Exchange Rates']
+        header_font, header_fill, center, bold = excel_styles()
+        for cell in worksheet[1]:
+            cell.font = header_font
+            cell.fill = header_fill
+            cell.alignment = center
+        for row in range(2, len(df) + 2):
+            cell = worksheet[f'A{row}']
+            cell.font = bold
+            cell.alignment = center
+        for column in worksheet.columns:
+            max_length = 0
+            column_letter = column[0].column_letter
+            for cell in column:
+                if len(str(cell.value)) > max_length:
+                    max_length = len(str(cell.value))
+            worksheet.column_dimensions[column_letter].width = min(max_length + 2, 15)
+
+def timed(label, func, filename):
+    """
+    Run one export, print its time and file size and return the seconds
+    """
+    started = time.perf_counter()
+    func(filename)
+    elapsed = time.perf_counter() - started
+    print(f"{label:<32} {elapsed:8.2f} s  {os.path.getsize(filename) / 1024:8.1f} KiB")
+    return elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the Excel export on a large multi-pair matrix')
+    parser.add_argument('--pairs', type=int, default=100,
+                       help='Number of currency pairs (default: 100)')
+    parser.add_argument('--years', type=int, default=30,
+                       help='Number of years per pair (default: 30)')
+    args = parser.parse_args()
+
+    tidy, wide = sample_frames(args.pairs, args.years)
+    scraper = XRatesScraper()
+    print(f"Wide matrix: {wide.shape[0]} rows x {wide.shape[1]} years, tidy frame: {len(tidy)} rows\n")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = lambda name: os.path.join(tmp, name)
+        legacy = timed("wide, legacy per-cell", lambda f: legacy_save_to_excel(wide, f), path('legacy.xlsx'))
+        timed("wide, save_to_excel", lambda f: scraper.save_to_excel(wide, f, write_only=False), path('wide.xlsx'))
+        streamed = timed("wide, save_to_excel write-only", lambda f: scraper.save_to_excel(wide, f, write_only=True), path('wide_wo.xlsx'))
+        timed("tidy, save_to_excel", lambda f: scraper.save_to_excel(tidy, f, index=False, write_only=False), path('tidy.xlsx'))
+        timed("tidy, save_to_excel write-only", lambda f: scraper.save_to_excel(tidy, f, index=False, write_only=True), path('tidy_wo.xlsx'))
+
+    print(f"\nWrite-only speedup over legacy on the wide matrix: {legacy / streamed:.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+import argparse
+import random
+import timeit
+
+from scrapeExchangeRates import MONTH_ORDER, fast_parse_average_rates, soup_parse_average_rates
+
+def sample_page(year=2020, from_currency="USD", to_currency="INR", padding=2000, rates=None):
+    """
+    Build a page shaped like an x-rates average page, with filler markup
+    around the OutputLinksAvg list
+    
+    rates is an optional {month: rate} mapping; random rates are used
+    for every month otherwise.
+    """
+    rnd = random.Random(f"{from_currency}{to_currency}{year}")
+    items = ""
+    for month in MONTH_ORDER:
+        rate = rnd.uniform(1, 100) if rates is None else rates.get(month)
+        if rate is None:
+            continue
+        items += (f'<li><a href="/average/?from={from_currency}&amp;to={to_currency}&amp;amount=1&amp;year={year}">'
+                  f'<span class="avgMonth">{month}</span> <span class="avgRate">{rate:.6f}</span> '
+                  f'<span class="avgDays">{rnd.randint(19, 23)} days</span></a></li>\n')
+    filler = '<div class="ad"><a href="/x"><p>Currency converter and historic rates</p></a></div>\n' * padding
+    return (f'<html><head><title>x-rates</title></head><body>{filler}'
+            f'<ul class="OutputLinksAvg">\n{items}</ul>{filler}</body></html>').encode('utf-8')
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare fast and BeautifulSoup parse time per page')
+    parser.add_argument('--page', default=None,
+                       help='Saved x-rates average page to parse (default: generated sample)')
+    parser.add_argument('--repeat', type=int, default=20,
+                       help='Parses per path (default: 20)')
+    args = parser.parse_args()
+
+    if args.page:
+        with open(args.page, 'rb') as f:
+            content = f.read()
+    else:
+        content = sample_page()
+
+    if fast_parse_average_rates(content) != soup_parse_average_rates(content):
+        print("✗ Fast path and BeautifulSoup disagree on this page")
+
+    print(f"Page size: {len(content) / 1024:.1f} KiB, {args.repeat} parses per path")
+    fast = timeit.timeit(lambda: fast_parse_average_rates(content), number=args.repeat) / args.repeat
+    soup = timeit.timeit(lambda: soup_parse_average_rates(content), number=args.repeat) / args.repeat
+    print(f"Fast path:     {fast * 1000:8.3f} ms/page")
+    print(f"BeautifulSoup: {soup * 1000:8.3f} ms/page")
+    print(f"Speedup:       {soup / fast:8.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Modules the plain import and the CSV/JSON path must not load
+HEAVY_MODULES = ['pandas', 'numpy', 'bs4', 'openpyxl', 'pyarrow', 'httpx', 'asyncio']
+
+def import_profile():
+    """
+    Run python -X importtime on the module once and return
+    ({module: cumulative us}, [(module, cumulative us)] for its direct imports)
+    """
+    env = dict(os.environ)
+    # Measure with cached bytecode, like an installed script
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import scrapeExchangeRates'],
+                            capture_output=True, text=True, cwd=SCRIPT_DIR, env=env, check=True)
+
+    cumulative = {}
+    direct = []
+    # Children are printed before their parent, so depth-1 lines are
+    # collected until the depth-0 line that owns them
+    pending = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative_us, name = line.split('|')
+        if not cumulative_us.strip().isdigit():
+            continue
+        depth = (len(name) - len(name.lstrip(' '))) // 2
+        module = name.strip()
+        cumulative[module] = int(cumulative_us)
+        if depth == 1:
+            pending.append((module, int(cumulative_us)))
+        elif depth == 0:
+            if module == 'scrapeExchangeRates':
+                direct = pending
+            pending = []
+    return cumulative, direct
+
+def main():
+    parser = argparse.ArgumentParser(description='Check the import time of scrapeExchangeRates against a budget')
+    parser.add_argument('--runs', type=int, default=7,
+                       help='Measured imports after one warm-up (default: 7)')
+    parser.add_argument('--budget-ms', type=float, default=150,
+                       help='Median import time allowed in ms (default: 150)')
+    parser.add_argument('--top', type=int, default=8,
+                       help='Heaviest direct imports to list (default: 8)')
+    parser.add_argument('--report', default=None,
+                       help='Also write the results as JSON to this file')
+    args = parser.parse_args()
+
+    import_profile()
+    profiles = [import_profile() for _ in range(args.runs)]
+    totals = [cumulative['scrapeExchangeRates'] / 1000 for cumulative, _ in profiles]
+    median = statistics.median(totals)
+    cumulative, direct = profiles[-1]
+    loaded = [module for module in HEAVY_MODULES if module in cumulative]
+
+    print(f"import scrapeExchangeRates: median {median:.1f} ms, min {min(totals):.1f} ms "
+          f"over {args.runs} runs (budget {args.budget_ms:.0f} ms)")
+    print(f"\n{'direct import':<28}{'ms':>8}")
+    for module, micros in sorted(direct, key=lambda item: -item[1])[:args.top]:
+        print(f"{module:<28}{micros / 1000:>8.1f}")
+
+    ok = median <= args.budget_ms and not loaded
+    if loaded:
+        print(f"\n✗ Heavy modules loaded at import: {', '.join(loaded)}")
+    print(f"\n{'✓ Within' if ok else '✗ Over'} the startup budget")
+
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump({'median_ms': median, 'runs_ms': totals, 'budget_ms': args.budget_ms,
+                       'heavy_loaded': loaded, 'direct_imports_us': dict(direct)}, f, indent=2)
+        print(f"Report written to {args.report}")
+
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
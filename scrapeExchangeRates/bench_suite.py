@@ -0,0 +1,266 @@
+import argparse
+import contextlib
+import glob
+import gzip
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+from datetime import datetime
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+from bench_parse import sample_page
+from scrapeExchangeRates import RateLimiter, XRatesScraper, build_rates_frame, parse_average_rates
+
+def content_encoders():
+    """
+    Content encoding -> compress function, most preferred first; br and
+    zstd only when brotli and zstandard are installed
+    """
+    encoders = {}
+    try:
+        import zstandard
+        encoders['zstd'] = zstandard.ZstdCompressor(level=3).compress
+    except ImportError:
+        pass
+    try:
+        import brotli
+        encoders['br'] = brotli.compress
+    except ImportError:
+        pass
+    encoders['gzip'] = gzip.compress
+    return encoders
+
+ENCODINGS = content_encoders()
+
+class FixtureStore:
+    """
+    Average pages served by the fixture server
+
+    Recorded pages are read from FROM_TO_YEAR.html files; anything not
+    recorded is generated with bench_parse.sample_page.
+    """
+    def __init__(self, fixtures_dir=None):
+        self.pages = {}
+        self.encoded = {}
+        if fixtures_dir:
+            for path in glob.glob(os.path.join(fixtures_dir, '*.html')):
+                name = os.path.splitext(os.path.basename(path))[0]
+                try:
+                    from_currency, to_currency, year = name.split('_')
+                    with open(path, 'rb') as f:
+                        self.pages[(from_currency.upper(), to_currency.upper(), int(year))] = f.read()
+                except ValueError:
+                    print(f"Skipping fixture with unexpected name: {path}")
+
+    def page(self, from_currency, to_currency, year):
+        """
+        Return the page body for one pair and year
+        """
+        key = (from_currency.upper(), to_currency.upper(), int(year))
+        if key not in self.pages:
+            self.pages[key] = sample_page(year, from_currency, to_currency)
+        return self.pages[key]
+
+    def encoded_page(self, from_currency, to_currency, year, accept_encoding):
+        """
+        Return (body, content encoding or None) in the best encoding the
+        Accept-Encoding header allows; compressed bodies are kept for reuse
+        """
+        accepted = {token.split(';')[0].strip().lower() for token in accept_encoding.split(',')}
+        for encoding in ENCODINGS:
+            if encoding in accepted:
+                key = (from_currency.upper(), to_currency.upper(), int(year), encoding)
+                if key not in self.encoded:
+                    self.encoded[key] = ENCODINGS[encoding](self.page(from_currency, to_currency, year))
+                return self.encoded[key], encoding
+        return self.page(from_currency, to_currency, year), None
+
+class FixtureServer:
+    """
+    Local HTTP server answering /average/?from=..&to=..&year=.. from a FixtureStore
+
+    With compress=True pages are sent in the best encoding the client accepts.
+    """
+    def __init__(self, store, host='127.0.0.1', port=0, compress=False):
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Headers and a small compressed body go out as two writes; with
+            # Nagle on, the body waits for the client's delayed ACK (~40 ms)
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                query = parse_qs(urlparse(self.path).query)
+                page = (query.get('from', ['USD'])[0], query.get('to', ['INR'])[0], query.get('year', ['2020'])[0])
+                body, encoding = store.page(*page), None
+                if compress:
+                    body, encoding = store.encoded_page(*page, self.headers.get('Accept-Encoding', ''))
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                if encoding:
+                    self.send_header('Content-Encoding', encoding)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/average/"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+def percentile(samples, pct):
+    """
+    Nearest-rank percentile of a list of seconds
+    """
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def summarize(name, samples, pages):
+    """
+    Throughput and latency percentiles (in ms) for one stage
+    """
+    total = sum(samples)
+    return {
+        'stage': name,
+        'runs': len(samples),
+        'pages_per_run': pages,
+        'pages_per_s': pages * len(samples) / total if total else None,
+        'mean_ms': statistics.fmean(samples) * 1000,
+        'p50_ms': percentile(samples, 50) * 1000,
+        'p90_ms': percentile(samples, 90) * 1000,
+        'p99_ms': percentile(samples, 99) * 1000,
+    }
+
+def measure(func, runs):
+    """
+    Time func runs times with the scraper's progress output silenced, after
+    one untimed warm-up run so lazy imports and first-call setup stay out
+    of the samples
+    """
+    samples = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        func()
+    for _ in range(runs):
+        with contextlib.redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            func()
+            samples.append(time.perf_counter() - started)
+    return samples
+
+def git_revision():
+    """
+    Short commit hash of the checkout, so reports can be compared across versions
+    """
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+def run_suite(args):
+    """
+    Measure every stage and return the report dict
+    """
+    store = FixtureStore(args.fixtures)
+    years = list(range(args.start_year, args.start_year + args.years))
+    results = []
+
+    with FixtureServer(store) as server:
+        scraper = XRatesScraper(server.base_url, rate_limiter=RateLimiter(args.rate, args.rate))
+        urls = [f"{server.base_url}?from=USD&to=INR&amount=1&year={year}" for year in years]
+        # Fetching and parsing every page once here also warms up those stages
+        pages = [scraper.session.get(url, timeout=10).content for url in urls]
+        parsed = {year: parse_average_rates(page) for year, page in zip(years, pages)}
+
+        # Fetch: one request per page over the scraper's pooled session
+        fetch = []
+        for _ in range(args.runs):
+            for url in urls:
+                started = time.perf_counter()
+                scraper.session.get(url, timeout=10).content
+                fetch.append(time.perf_counter() - started)
+        results.append(summarize('fetch', fetch, 1))
+
+        # Parse: the extraction get_year_data runs on each page
+        parse = []
+        for _ in range(args.runs):
+            for page in pages:
+                started = time.perf_counter()
+                parse_average_rates(page)
+                parse.append(time.perf_counter() - started)
+        results.append(summarize('parse', parse, 1))
+
+        # Assemble: the month x year DataFrame built by scrape_multiple_years
+        results.append(summarize('assemble', measure(lambda: build_rates_frame(parsed), args.runs), len(years)))
+
+        # End to end scrape_multiple_years against the fixture server
+        end_to_end = measure(lambda: scraper.scrape_multiple_years(years[0], years[-1], workers=args.workers), args.runs)
+        results.append(summarize('scrape_multiple_years', end_to_end, len(years)))
+
+        df = build_rates_frame(parsed)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'bench.xlsx')
+            results.append(summarize('save_to_excel', measure(lambda: scraper.save_to_excel(df, path), args.runs), len(years)))
+
+    return {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': vars(args),
+        'stages': results,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline benchmark of the XRatesScraper stages against a local fixture server')
+    parser.add_argument('--fixtures', default=None,
+                       help='Directory of recorded pages named FROM_TO_YEAR.html (default: generated pages)')
+    parser.add_argument('--start-year', type=int, default=1995,
+                       help='First year served (default: 1995)')
+    parser.add_argument('--years', type=int, default=30,
+                       help='Number of years per run (default: 30)')
+    parser.add_argument('--runs', type=int, default=5,
+                       help='Repetitions per stage (default: 5)')
+    parser.add_argument('--workers', type=int, default=4,
+                       help='Workers for the scrape_multiple_years stage (default: 4)')
+    parser.add_argument('--rate', type=float, default=1000,
+                       help='Rate limit against the fixture server in requests/s (default: 1000)')
+    parser.add_argument('--report', default='bench_report.json',
+                       help='JSON report path (default: bench_report.json)')
+    args = parser.parse_args()
+
+    report = run_suite(args)
+
+    print(f"\n{'stage':<24}{'pages/s':>12}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}")
+    for stage in report['stages']:
+        print(f"{stage['stage']:<24}{stage['pages_per_s']:>12.1f}{stage['p50_ms']:>10.2f}"
+              f"{stage['p90_ms']:>10.2f}{stage['p99_ms']:>10.2f}")
+
+    with open(args.report, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReport written to {args.report}")
+
+if __name__ == "__main__":
+    main()
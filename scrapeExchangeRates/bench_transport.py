@@ -0,0 +1,295 @@
+import argparse
+import contextlib
+import io
+import queue
+import socket
+import threading
+import time
+from urllib.parse import urlparse, parse_qs
+
+import h2.config
+import h2.connection
+import h2.events
+import h2.exceptions
+
+from bench_suite import ENCODINGS, FixtureServer, FixtureStore
+from scrapeExchangeRates import RateLimiter, XRatesScraper
+
+class H2FixtureServer:
+    """
+    Local HTTP/2 server (h2c with prior knowledge) answering the same
+    /average/ queries as bench_suite.FixtureServer, in the best encoding
+    the client accepts
+    """
+    def __init__(self, store, host='127.0.0.1', port=0):
+        self.store = store
+        self.sock = socket.create_server((host, port))
+        self.thread = threading.Thread(target=self.serve, daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self.sock.getsockname()[:2]
+        return f"http://{host}:{port}/average/"
+
+    def serve(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            threading.Thread(target=self.handle, args=(conn,), daemon=True).start()
+
+    def handle(self, conn):
+        """
+        Answer every stream of one connection, sending bodies as the
+        client's flow control windows allow
+        """
+        h2conn = h2.connection.H2Connection(h2.config.H2Configuration(client_side=False, header_encoding='utf-8'))
+        h2conn.initiate_connection()
+        pending = {}
+        with conn:
+            conn.sendall(h2conn.data_to_send())
+            while True:
+                try:
+                    data = conn.recv(65536)
+                    if not data:
+                        return
+                    events = h2conn.receive_data(data)
+                except (OSError, h2.exceptions.ProtocolError):
+                    return
+                for event in events:
+                    if isinstance(event, h2.events.RequestReceived):
+                        headers = dict(event.headers)
+                        query = parse_qs(urlparse(headers[':path']).query)
+                        body, encoding = self.store.encoded_page(query.get('from', ['USD'])[0], query.get('to', ['INR'])[0],
+                                                                 query.get('year', ['2020'])[0],
+                                                                 headers.get('accept-encoding', ''))
+                        response = [(':status', '200'), ('content-type', 'text/html; charset=utf-8'),
+                                    ('content-length', str(len(body)))]
+                        if encoding:
+                            response.append(('content-encoding', encoding))
+                        h2conn.send_headers(event.stream_id, response)
+                        pending[event.stream_id] = body
+                    elif isinstance(event, h2.events.StreamReset):
+                        pending.pop(event.stream_id, None)
+                    elif isinstance(event, h2.events.ConnectionTerminated):
+                        return
+                self.send_pending(h2conn, pending)
+                try:
+                    conn.sendall(h2conn.data_to_send())
+                except OSError:
+                    return
+
+    @staticmethod
+    def send_pending(h2conn, pending):
+        for stream_id in list(pending):
+            body = pending[stream_id]
+            while body:
+                size = min(h2conn.local_flow_control_window(stream_id), h2conn.max_outbound_frame_size, len(body))
+                if size <= 0:
+                    break
+                h2conn.send_data(stream_id, body[:size])
+                body = body[size:]
+            if body:
+                pending[stream_id] = body
+            else:
+                h2conn.end_stream(stream_id)
+                del pending[stream_id]
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.sock.close()
+
+class CountingProxy:
+    """
+    TCP proxy in front of a fixture server that counts the bytes crossing
+    it in each direction, headers and framing included
+
+    latency adds that many seconds of round trip: half on every relayed
+    read in each direction, and a full one before a new connection is
+    relayed, standing in for the TCP handshake.
+    """
+    def __init__(self, target_url, host='127.0.0.1', latency=0.0):
+        self.latency = latency
+        parsed = urlparse(target_url)
+        self.target = (parsed.hostname, parsed.port)
+        self.path = parsed.path
+        self.sock = socket.create_server((host, 0))
+        self.lock = threading.Lock()
+        self.sent = 0
+        self.received = 0
+        self.connections = 0
+        self.thread = threading.Thread(target=self.serve, daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self.sock.getsockname()[:2]
+        return f"http://{host}:{port}{self.path}"
+
+    def reset(self):
+        with self.lock:
+            self.sent = self.received = self.connections = 0
+
+    def serve(self):
+        while True:
+            try:
+                client, _ = self.sock.accept()
+            except OSError:
+                return
+            with self.lock:
+                self.connections += 1
+            threading.Thread(target=self.relay, args=(client,), daemon=True).start()
+
+    def relay(self, client):
+        time.sleep(self.latency)
+        upstream = socket.create_connection(self.target)
+        # Relay every segment at once so the proxy adds no Nagle delay
+        for sock in (client, upstream):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        threading.Thread(target=self.pipe, args=(upstream, client, False), daemon=True).start()
+        self.pipe(client, upstream, True)
+
+    def pipe(self, source, sink, upload):
+        """
+        Copy source to sink, each read delivered half a round trip after it
+        arrived without holding up the reads behind it
+        """
+        chunks = queue.Queue()
+        writer = threading.Thread(target=self.deliver, args=(chunks, sink), daemon=True)
+        writer.start()
+        try:
+            while True:
+                data = source.recv(65536)
+                if not data:
+                    break
+                with self.lock:
+                    if upload:
+                        self.sent += len(data)
+                    else:
+                        self.received += len(data)
+                chunks.put((time.perf_counter() + self.latency / 2, data))
+        except OSError:
+            pass
+        chunks.put((time.perf_counter() + self.latency / 2, None))
+        writer.join()
+        try:
+            source.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    @staticmethod
+    def deliver(chunks, sink):
+        while True:
+            due, data = chunks.get()
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            try:
+                if data is None:
+                    sink.shutdown(socket.SHUT_RDWR)
+                    return
+                sink.sendall(data)
+            except OSError:
+                return
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.sock.close()
+
+def run_transport(make_scraper, proxy, pairs, start_year, end_year, workers, runs):
+    """
+    Best pages/s over runs of scrape_pairs with a fresh scraper each time,
+    plus wire and body bytes per page, connections opened and the frame
+    """
+    best = None
+    for _ in range(runs):
+        scraper = make_scraper()
+        proxy.reset()
+        with contextlib.redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            df = scraper.scrape_pairs(pairs, start_year, end_year, workers)
+            elapsed = time.perf_counter() - started
+        scraper.session.close()
+        pages = len(pairs) * (end_year - start_year + 1)
+        result = {
+            'pages_per_s': pages / elapsed,
+            'down_per_page': proxy.received / pages,
+            'up_per_page': proxy.sent / pages,
+            'body_per_page': scraper.bytes_read / pages,
+            'connections': proxy.connections,
+            'frame': df,
+        }
+        if best is None or result['pages_per_s'] > best['pages_per_s']:
+            best = result
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the requests and httpx (HTTP/2, brotli/zstd) transports on local fixture servers')
+    parser.add_argument('--pairs', type=int, default=4,
+                       help='Currency pairs per run (default: 4)')
+    parser.add_argument('--start-year', type=int, default=1995,
+                       help='First year served (default: 1995)')
+    parser.add_argument('--years', type=int, default=30,
+                       help='Years per pair (default: 30)')
+    parser.add_argument('--runs', type=int, default=3,
+                       help='Runs per transport; the best is reported (default: 3)')
+    parser.add_argument('--latency-ms', type=float, default=0,
+                       help='Round trip added by the proxy in front of each server (default: 0)')
+    parser.add_argument('--rate', type=float, default=10000,
+                       help='Rate limit against the fixture servers in requests/s (default: 10000)')
+    args = parser.parse_args()
+
+    pairs = [('USD', currency) for currency in ['INR', 'EUR', 'GBP', 'JPY', 'CHF', 'AUD', 'CAD', 'CNY'][:args.pairs]]
+    end_year = args.start_year + args.years - 1
+    store = FixtureStore()
+    # Compress every page up front so the servers only pay for sending
+    for from_currency, to_currency in pairs:
+        for year in range(args.start_year, end_year + 1):
+            for encoding in ENCODINGS:
+                store.encoded_page(from_currency, to_currency, year, encoding)
+
+    print(f"{len(pairs)} pairs x {args.years} years, encodings offered: {', '.join(ENCODINGS)}, "
+          f"added round trip: {args.latency_ms:.0f} ms\n")
+    print(f"{'transport':<30}{'workers':>8}{'pages/s':>10}{'down B/page':>13}{'up B/page':>11}{'body B/page':>13}{'conns':>7}")
+
+    with FixtureServer(store, compress=True) as http1, H2FixtureServer(store) as http2, \
+            CountingProxy(http1.base_url, latency=args.latency_ms / 1000) as http1_proxy, \
+            CountingProxy(http2.base_url, latency=args.latency_ms / 1000) as http2_proxy:
+        def requests_scraper(workers):
+            return XRatesScraper(http1_proxy.base_url, rate_limiter=RateLimiter(args.rate, args.rate),
+                                 pool_size=max(10, workers))
+
+        def httpx_scraper(workers):
+            return XRatesScraper(http1_proxy.base_url, rate_limiter=RateLimiter(args.rate, args.rate),
+                                 pool_size=max(10, workers), transport='httpx')
+
+        def httpx_h2_scraper(workers):
+            return XRatesScraper(http2_proxy.base_url, rate_limiter=RateLimiter(args.rate, args.rate),
+                                 pool_size=max(10, workers), transport='httpx', http2_prior_knowledge=True)
+
+        transports = [
+            ('requests, HTTP/1.1, gzip', requests_scraper, http1_proxy),
+            ('httpx, HTTP/1.1, ' + next(iter(ENCODINGS)), httpx_scraper, http1_proxy),
+            ('httpx, HTTP/2, ' + next(iter(ENCODINGS)), httpx_h2_scraper, http2_proxy),
+        ]
+        frames = []
+        for workers in (1, 8):
+            for name, make_scraper, proxy in transports:
+                result = run_transport(lambda: make_scraper(workers), proxy, pairs, args.start_year, end_year,
+                                       workers, args.runs)
+                frames.append(result['frame'])
+                print(f"{name:<30}{workers:>8}{result['pages_per_s']:>10.1f}{result['down_per_page']:>13.0f}"
+                      f"{result['up_per_page']:>11.0f}{result['body_per_page']:>13.0f}{result['connections']:>7}")
+
+    same = all(frame.equals(frames[0]) for frame in frames)
+    print(f"\n{'✓' if same else '✗'} Every transport parsed {'the same' if same else 'different'} rates "
+          f"({len(frames[0])} rows)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from bench_suite import FixtureServer, FixtureStore
+from scrapeExchangeRates import MONTH_ORDER, RateLimiter, RateStore, ResponseCache, XRatesScraper
+
+class CountingStore(FixtureStore):
+    """
+    FixtureStore that counts the pages it serves
+    """
+    def __init__(self):
+        super().__init__()
+        self.served = 0
+
+    def page(self, from_currency, to_currency, year):
+        self.served += 1
+        return super().page(from_currency, to_currency, year)
+
+def store_entry(cache, key, data, fetched_at):
+    """
+    Write a cache entry as if it had been fetched at fetched_at
+    """
+    entry = cache.put(key, data)
+    entry["fetched_at"] = fetched_at
+    with open(cache._path(key), "w", encoding="utf-8") as f:
+        json.dump(entry, f)
+
+def check(ok, message):
+    print(f"{'✓' if ok else '✗'} {message}")
+    return ok
+
+def main():
+    now = datetime.now()
+    last_year = now.year - 1
+    mid_december = datetime(last_year, 12, 15).timestamp()
+    after_year_end = datetime(now.year, 1, 1, 12).timestamp()
+    results = []
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = ResponseCache(tmp, ttl=3600)
+        results.append(check(not cache.is_fresh({"fetched_at": mid_december}, last_year),
+                             "past year fetched before its end is not fresh once the TTL is over"))
+        results.append(check(cache.is_fresh({"fetched_at": after_year_end}, last_year),
+                             "past year fetched after its end stays fresh"))
+        results.append(check(cache.is_fresh({"fetched_at": time.time()}, now.year),
+                             "current year is fresh within the TTL"))
+        results.append(check(not cache.is_fresh({"fetched_at": time.time() - 7200}, now.year),
+                             "current year is stale after the TTL"))
+
+        # End to end: a partial last-year page cached in December is fetched again
+        store = CountingStore()
+        with FixtureServer(store) as server:
+            scraper = XRatesScraper(server.base_url, rate_limiter=RateLimiter(1000, 1000), cache=cache)
+            key = [server.base_url, "USD", "INR", 1, last_year]
+            store_entry(cache, key, {month: 1.0 for month in MONTH_ORDER[:11]}, mid_december)
+            with contextlib.redirect_stdout(io.StringIO()):
+                first = scraper.get_year_data(last_year)
+                second = scraper.get_year_data(last_year)
+        results.append(check(store.served == 1 and len(first or {}) == 12 and first == second,
+                             f"partial December entry refetched once, then cached ({store.served} request)"))
+
+        # update_store must not merge a cached partial year, even one still within the TTL
+        store = CountingStore()
+        with FixtureServer(store) as server:
+            long_cache = ResponseCache(os.path.join(tmp, "long"), ttl=10 * 365 * 86400)
+            scraper = XRatesScraper(server.base_url, rate_limiter=RateLimiter(1000, 1000), cache=long_cache)
+            store_entry(long_cache, [server.base_url, "USD", "INR", 1, last_year],
+                        {month: 1.0 for month in MONTH_ORDER[:11]}, mid_december)
+            rate_store = RateStore(os.path.join(tmp, "rates.sqlite"))
+            with contextlib.redirect_stdout(io.StringIO()):
+                records = scraper.update_store(rate_store, [("USD", "INR")], last_year, last_year)
+            rate_store.close()
+        results.append(check(store.served == 1 and len(records) == 12,
+                             f"update_store revalidates cached stale cells ({len(records)} months stored)"))
+
+    sys.exit(0 if all(results) else 1)
+
+if __name__ == "__main__":
+    main()
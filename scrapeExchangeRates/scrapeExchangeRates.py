@@ -1,224 +1,3530 @@
 import requests
-from bs4 import BeautifulSoup
-import pandas as pd
 import time
 import re
-from datetime import datetime
+from datetime import datetime, date, timedelta
 import argparse
+import builtins
 import sys
+import tempfile
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from requests.adapters import HTTPAdapter
+from urllib.parse import urljoin, urlparse, parse_qs
+import csv
+import gzip
+import hashlib
+import io
+import importlib
+import importlib.util
+import json
+import os
+import sqlite3
+import struct
+import queue
+import random
+from email.utils import parsedate_to_datetime
+import socket
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from collections import OrderedDict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import zipfile
+from xml.etree import ElementTree
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+from urllib3.util.connection import allowed_gai_family
+
+class LazyModule:
+    """
+    Stand-in for a module that is only imported on first attribute access
+    
+    pandas, numpy, asyncio and httpx cost most of the startup time, and a
+    single-page CSV/JSON run never touches them.
+    """
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+    
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+def module_available(name):
+    """
+    True if an optional module can be imported, without importing it
+    """
+    return importlib.util.find_spec(name) is not None
+
+pd = LazyModule('pandas')
+np = LazyModule('numpy')
+asyncio = LazyModule('asyncio')
+httpx = LazyModule('httpx')
+
+# Progress lines come from the page fetcher, the parser and worker threads
+# at once; one lock keeps each print whole instead of merging lines
+_print_lock = threading.RLock()
+
+def print(*args, **kwargs):
+    with _print_lock:
+        builtins.print(*args, **kwargs)
+
+MONTH_ORDER = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
+               'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+
+# Add headers to avoid being blocked
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.5',
+    'Accept-Encoding': 'gzip, deflate',
+    'Connection': 'keep-alive',
+    'Upgrade-Insecure-Requests': '1',
+}
+
+AVG_SPAN_RE = re.compile(rb'<span[^>]*class=["\'][^"\']*\b(avgMonth|avgRate)\b[^>]*>(.*?)</span>', re.S | re.I)
+TAG_RE = re.compile(rb'<[^>]+>')
+
+def fast_parse_average_rates(content):
+    """
+    Extract the month -> rate mapping by slicing out ul.OutputLinksAvg
+    
+    Only the list itself is scanned, so the cost no longer grows with the
+    size of the rest of the page. Returns None when nothing was found.
+    """
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+    
+    marker = content.find(b'OutputLinksAvg')
+    if marker == -1:
+        return None
+    start = content.rfind(b'<ul', 0, marker)
+    end = content.find(b'</ul>', marker)
+    if start == -1 or end == -1:
+        return None
+    
+    year_data = {}
+    
+    for li in content[start:end].split(b'<li')[1:]:
+        spans = {name: TAG_RE.sub(b'', text).strip() for name, text in AVG_SPAN_RE.findall(li)}
+        if b'avgMonth' in spans and b'avgRate' in spans:
+            rate_match = re.search(rb'[\d.]+', spans[b'avgRate'])
+            if rate_match:
+                year_data[spans[b'avgMonth'].decode('utf-8', 'replace')] = float(rate_match.group())
+    
+    return year_data or None
+
+def parse_average_rates(content):
+    """
+    Parse the month -> rate mapping out of an x-rates average page
+    
+    Tries the fast slice-and-scan path first and falls back to a full
+    BeautifulSoup parse if it finds nothing. Returns None when the page has
+    no OutputLinksAvg list.
+    """
+    year_data = fast_parse_average_rates(content)
+    if year_data:
+        return year_data
+    return soup_parse_average_rates(content)
+
+def soup_parse_average_rates(content):
+    """
+    Parse the month -> rate mapping with a full BeautifulSoup tree
+    """
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(content, 'html.parser')
+    
+    # Find the OutputLinksAvg class
+    output_links = soup.find('ul', class_='OutputLinksAvg')
+    
+    if not output_links:
+        return None
+    
+    year_data = {}
+    
+    # Parse each month's data
+    for li in output_links.find_all('li'):
+        month_span = li.find('span', class_='avgMonth')
+        rate_span = li.find('span', class_='avgRate')
+        
+        if month_span and rate_span:
+            month = month_span.text.strip()
+            rate_text = rate_span.text.strip()
+            
+            # Extract numeric value from rate
+            rate_match = re.search(r'[\d.]+', rate_text)
+            if rate_match:
+                rate = float(rate_match.group())
+                year_data[month] = rate
+    
+    return year_data
+
+HISTORICAL_RATE_RE = re.compile(rb'graph/\?from=([A-Za-z]{3})&(?:amp;)?to=([A-Za-z]{3})[^>]*>\s*([\d.,]+)\s*</a>')
+
+def parse_historical_rates(content, from_currency):
+    """
+    Parse the to_currency -> rate mapping out of an x-rates historical page
+    
+    Every rate on the page links to graph/?from=X&to=Y, so one regex pass
+    finds them; BeautifulSoup is only used if that finds nothing. Returns
+    None when the page has no rates for from_currency.
+    """
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+    
+    rates = {}
+    for link_from, link_to, value in HISTORICAL_RATE_RE.findall(content):
+        if link_from.decode().upper() == from_currency:
+            rates[link_to.decode().upper()] = float(value.replace(b',', b''))
+    if rates:
+        return rates
+    
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(content, 'html.parser')
+    for link in soup.select('table.ratesTable a[href*="from="]'):
+        match = re.search(r'from=([A-Za-z]{3})&(?:amp;)?to=([A-Za-z]{3})', link.get('href', ''))
+        rate_match = re.search(r'[\d.]+', link.text.replace(',', ''))
+        if match and rate_match and match.group(1).upper() == from_currency:
+            rates[match.group(2).upper()] = float(rate_match.group())
+    
+    return rates or None
+
+def build_rates_frame(results):
+    """
+    Turn a year -> {month: rate} mapping into the month x year DataFrame
+    """
+    tidy = build_tidy_frame({(None, None, year): year_data for year, year_data in results.items()})
+    return rates_matrix(tidy)
+
+def rates_table(results):
+    """
+    Plain-Python month x year table of a year -> {month: rate} mapping
+    
+    Returns (years, rows) with rows as [month, rate or None, ...], laid out
+    like build_rates_frame but without importing pandas.
+    """
+    years = sorted(year for year, year_data in results.items() if year_data)
+    present = {month for year in years for month in results[year]}
+    rows = [[month] + [results[year].get(month) for year in years]
+            for month in MONTH_ORDER if month in present]
+    return years, rows
+
+# Compact rate record: pair code into RateRecords.pairs, year, month 1-12, rate
+RATE_RECORD_FIELDS = [('pair', 'i4'), ('year', 'i2'), ('month', 'u1'), ('rate', 'f8')]
+
+class RateRecords:
+    """
+    Growable NumPy structured array of monthly rates
+    
+    One 15-byte record per pair, year and month instead of a dict per page
+    and a boxed float per month. Pairs are stored once in self.pairs and
+    referenced by code. Rates stay float64: x-rates publishes 6 decimals on
+    values up to 1e5, more than float32's 7 significant digits hold.
+    """
+    MONTH_NUMBERS = {month: i + 1 for i, month in enumerate(MONTH_ORDER)}
+    
+    def __init__(self, capacity=1024):
+        self.pairs = []
+        self.pair_codes = {}
+        self.records = np.empty(capacity, dtype=RATE_RECORD_FIELDS)
+        self.size = 0
+    
+    def __len__(self):
+        return self.size
+    
+    @classmethod
+    def from_results(cls, results):
+        """
+        Build from a (from_currency, to_currency, year) -> {month: rate} mapping
+        """
+        records = cls(max(1, sum(len(year_data) for year_data in results.values() if year_data)))
+        for job, year_data in results.items():
+            records.add(job, year_data)
+        return records
+    
+    @property
+    def array(self):
+        """
+        The filled part of the structured array
+        """
+        return self.records[:self.size]
+    
+    @property
+    def nbytes(self):
+        """
+        Bytes held by the filled records plus the pair names
+        """
+        return self.array.nbytes + sum(sys.getsizeof(f) + sys.getsizeof(t) for f, t in self.pairs)
+    
+    def pair_code(self, from_currency, to_currency):
+        pair = (from_currency, to_currency)
+        if pair not in self.pair_codes:
+            self.pair_codes[pair] = len(self.pairs)
+            self.pairs.append(pair)
+        return self.pair_codes[pair]
+    
+    def _reserve(self, count):
+        if self.size + count > len(self.records):
+            grown = np.empty(max(self.size + count, 2 * len(self.records)), dtype=RATE_RECORD_FIELDS)
+            grown[:self.size] = self.array
+            self.records = grown
+    
+    def add(self, job, year_data):
+        """
+        Append one page's {month: rate}; months outside MONTH_ORDER are dropped
+        """
+        if not year_data:
+            return
+        months = [(self.MONTH_NUMBERS[month], rate) for month, rate in year_data.items() if month in self.MONTH_NUMBERS]
+        self._reserve(len(months))
+        code = self.pair_code(job[0], job[1])
+        for month_num, rate in months:
+            self.records[self.size] = (code, job[2], month_num, rate)
+            self.size += 1
+    
+    def add_rows(self, rows):
+        """
+        Append (from_currency, to_currency, year, month_num, rate) rows
+        """
+        rows = list(rows)
+        self._reserve(len(rows))
+        for from_currency, to_currency, year, month_num, rate in rows:
+            self.records[self.size] = (self.pair_code(from_currency, to_currency), year, month_num, rate)
+            self.size += 1
+    
+    def to_frame(self):
+        """
+        The tidy frame of build_tidy_frame: sorted by pair, year and month,
+        with categorical pair/from_currency/to_currency, int16 year, ordered
+        categorical month and float64 rate
+        """
+        array = self.array
+        labels = [f"{f}/{t}" for f, t in self.pairs]
+        by_label = sorted(range(len(labels)), key=labels.__getitem__)
+        rank = np.empty(len(labels), dtype=np.int32)
+        rank[by_label] = np.arange(len(labels), dtype=np.int32)
+        
+        pair_code = rank[array['pair']]
+        order = np.lexsort((array['month'], array['year'], pair_code))
+        pair_code = pair_code[order]
+        # Only pairs with rows become categories, in label order
+        used = np.unique(pair_code)
+        remap = np.full(len(labels), -1, dtype=np.int32)
+        remap[used] = np.arange(len(used), dtype=np.int32)
+        pair_code = remap[pair_code]
+        pair_names = [self.pairs[by_label[code]] for code in used]
+        
+        def currency_column(names):
+            categories = sorted(set(names))
+            positions = {name: i for i, name in enumerate(categories)}
+            codes = np.array([positions[name] for name in names], dtype=np.int32)
+            return pd.Categorical.from_codes(codes[pair_code], categories)
+        
+        return pd.DataFrame({
+            'pair': pd.Categorical.from_codes(pair_code, [f"{f}/{t}" for f, t in pair_names]),
+            'from_currency': currency_column([str(f) for f, _ in pair_names]),
+            'to_currency': currency_column([str(t) for _, t in pair_names]),
+            'year': array['year'][order],
+            'month': pd.Categorical.from_codes(array['month'][order].astype(np.int8) - 1, MONTH_ORDER, ordered=True),
+            'rate': array['rate'][order],
+        })
+
+def format_bytes(size):
+    """
+    Human readable byte count in KiB, MiB or GiB
+    """
+    for unit in ('KiB', 'MiB'):
+        size /= 1024
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+    return f"{size / 1024:.1f} GiB"
+
+def memory_footprint(tidy, records=None):
+    """
+    Bytes used by a tidy frame as built here, compared with the same rows
+    as object-typed columns and as the per-page dicts the scraper used to keep
+    (plus records_bytes, the RateRecords it was built from, when given)
+    
+    The object figure is what memory_usage(deep=True) reports for the
+    frame with its categoricals cast to str and year/month widened. The dict
+    figure counts one {month: rate} dict, its boxed floats and job key per
+    (pair, year).
+    """
+    rows = len(tidy)
+    typed = int(tidy.memory_usage(deep=True, index=False).sum())
+    
+    objects = rows * 8 * 6
+    for column in ('pair', 'from_currency', 'to_currency', 'month'):
+        counts = tidy[column].value_counts(sort=False)
+        objects += sum(sys.getsizeof(str(value)) * int(count) for value, count in counts.items())
+    
+    months_per_page = tidy.groupby(['pair', 'year'], observed=True).size().to_numpy()
+    dict_sizes = {n: sys.getsizeof(dict.fromkeys(MONTH_ORDER[:n], 1.0)) for n in np.unique(months_per_page)}
+    pages = len(months_per_page)
+    dicts = (sum(dict_sizes[n] for n in months_per_page) + rows * sys.getsizeof(1.0)
+             + pages * (sys.getsizeof(("USD", "INR", 2020)) + sys.getsizeof(2020))
+             + sys.getsizeof(dict.fromkeys(range(pages))))
+    footprint = {'rows': rows, 'typed_bytes': typed, 'object_bytes': objects, 'dict_bytes': int(dicts)}
+    if records is not None:
+        footprint['records_bytes'] = records.nbytes
+    return footprint
+
+def build_tidy_frame(results):
+    """
+    Turn a (from_currency, to_currency, year) -> {month: rate} mapping into
+    a long DataFrame with one row per pair, year and month (see
+    RateRecords.to_frame for the column types)
+    """
+    return RateRecords.from_results(results).to_frame()
+
+def rates_matrix(tidy, pair=None):
+    """
+    Month x year view of one pair of a tidy frame (the layout
+    scrape_multiple_years has always returned)
+    """
+    if pair is not None:
+        tidy = tidy[tidy['pair'] == pair]
+    
+    years, year_index = np.unique(tidy['year'].to_numpy(), return_inverse=True)
+    month_codes = tidy['month'].cat.codes.to_numpy()
+    
+    matrix = np.full((len(MONTH_ORDER), len(years)), np.nan)
+    matrix[month_codes, year_index] = tidy['rate'].to_numpy()
+    
+    # Only include months that exist in the data
+    present = np.unique(month_codes)
+    return pd.DataFrame(matrix[present], index=[MONTH_ORDER[code] for code in present],
+                        columns=pd.Index(years.astype(np.int64)))
+
+def tidy_from_matrix(df, from_currency, to_currency):
+    """
+    Tidy frame of one pair from its month x year matrix (the inverse of rates_matrix)
+    """
+    stacked = df.stack().dropna()
+    records = RateRecords(max(1, len(stacked)))
+    records.add_rows((from_currency, to_currency, int(year), RateRecords.MONTH_NUMBERS[month], float(rate))
+                     for (month, year), rate in stacked.items())
+    return records.to_frame()
+
+def derive_cross_rates(anchor_tidy, anchor, currencies):
+    """
+    Derive every FROM/TO rate from the anchor/X rates in anchor_tidy
+    
+    The anchor rates are scattered into a (currency x year x month) cube,
+    with the anchor itself fixed at 1. Every cross rate then comes from one
+    broadcast division: rate(A -> B) = rate(anchor -> B) / rate(anchor -> A).
+    Returns a tidy frame like build_tidy_frame.
+    """
+    currencies = sorted(set(currencies) | {anchor})
+    position = {currency: i for i, currency in enumerate(currencies)}
+    n = len(currencies)
+    
+    anchor_rows = anchor_tidy[(anchor_tidy['from_currency'] == anchor)
+                              & anchor_tidy['to_currency'].isin(currencies)]
+    years = np.unique(anchor_rows['year'].to_numpy())
+    
+    cube = np.full((n, len(years), len(MONTH_ORDER)), np.nan)
+    cube[position[anchor]] = 1.0
+    cube[anchor_rows['to_currency'].map(position).to_numpy(dtype=np.int64),
+         np.searchsorted(years, anchor_rows['year'].to_numpy()),
+         anchor_rows['month'].cat.codes.to_numpy()] = anchor_rows['rate'].to_numpy()
+    
+    # cross[i, j] = rate from currency i to currency j
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cross = cube[None, :, :, :] / cube[:, None, :, :]
+    valid = np.isfinite(cross) & ~np.eye(n, dtype=bool)[:, :, None, None]
+    
+    # Mask broadcast views instead of np.nonzero, so each column is built
+    # directly in its narrow dtype without int64 index arrays
+    def column(values, axis):
+        shape = [1, 1, 1, 1]
+        shape[axis] = len(values)
+        return np.broadcast_to(values.reshape(shape), cross.shape)[valid]
+    
+    from_code = column(np.arange(n, dtype=np.int16), 0)
+    to_code = column(np.arange(n, dtype=np.int16), 1)
+    
+    pair_labels = [f"{a}/{b}" for a in currencies for b in currencies]
+    return pd.DataFrame({
+        'pair': pd.Categorical.from_codes(from_code.astype(np.int32) * n + to_code, pair_labels).remove_unused_categories(),
+        'from_currency': pd.Categorical.from_codes(from_code, currencies),
+        'to_currency': pd.Categorical.from_codes(to_code, currencies),
+        'year': column(years.astype(np.int16), 2),
+        'month': pd.Categorical.from_codes(column(np.arange(len(MONTH_ORDER), dtype=np.int8), 3), MONTH_ORDER, ordered=True),
+        'rate': cross[valid],
+    })
+
+def cross_rate_drift(derived, direct):
+    """
+    Compare derived cross rates with directly scraped ones
+    
+    Returns the number of pairs and cells compared plus mean and max
+    relative drift in percent, or None when nothing overlaps.
+    """
+    keys = ['pair', 'year', 'month']
+    left = derived[keys + ['rate']].astype({'pair': str, 'month': str})
+    right = direct[keys + ['rate']].astype({'pair': str, 'month': str})
+    merged = left.merge(right, on=keys, suffixes=('_derived', '_direct'))
+    merged = merged[merged['rate_direct'] != 0]
+    if merged.empty:
+        return None
+    
+    drift = (merged['rate_derived'] / merged['rate_direct'] - 1).abs() * 100
+    worst = drift.idxmax()
+    return {
+        'pairs': merged['pair'].nunique(),
+        'cells': len(merged),
+        'mean_pct': float(drift.mean()),
+        'max_pct': float(drift.max()),
+        'worst': (merged.at[worst, 'pair'], int(merged.at[worst, 'year']), merged.at[worst, 'month']),
+    }
+
+# One canonical (label, rate) record per hashed row: label is the month
+# number for monthly rates and days since 1970-01-01 for daily rates
+CELL_RECORD = struct.Struct('<qd')
+
+def cell_digest(items):
+    """
+    SHA-256 of one (pair, year) cell given its (label, rate) items
+    """
+    return hashlib.sha256(b"".join(CELL_RECORD.pack(label, rate) for label, rate in sorted(items))).hexdigest()
+
+def year_rates_hashes(results, pair):
+    """
+    {"FROM/TO YEAR": digest} for a year -> {month: rate} mapping
+    """
+    month_numbers = {month: i + 1 for i, month in enumerate(MONTH_ORDER)}
+    return {f"{pair} {year}": cell_digest((month_numbers[month], rate) for month, rate in year_data.items()
+                                          if month in month_numbers)
+            for year, year_data in results.items() if year_data}
+
+def content_hashes(df, index=True, pair=None):
+    """
+    {"FROM/TO YEAR": digest} for a frame, independent of the output format
+    
+    Handles the month x year frame of one pair (index=True), tidy monthly
+    frames and tidy daily frames. The digests equal year_rates_hashes on
+    the same rates, so the CSV/JSON path and the pandas path agree.
+    """
+    if index:
+        stacked = df.stack().dropna()
+        pairs = np.full(len(stacked), pair, dtype=object)
+        years = stacked.index.get_level_values(1).to_numpy(dtype=np.int64)
+        labels = np.array([MONTH_ORDER.index(month) + 1 for month in stacked.index.get_level_values(0)], dtype=np.int64)
+        rates = stacked.to_numpy(dtype=np.float64)
+    elif 'date' in df.columns:
+        dates = pd.to_datetime(df['date'])
+        pairs = df['pair'].astype(str).to_numpy()
+        years = dates.dt.year.to_numpy(dtype=np.int64)
+        labels = (dates - pd.Timestamp('1970-01-01')).dt.days.to_numpy(dtype=np.int64)
+        rates = df['rate'].to_numpy(dtype=np.float64)
+    else:
+        pairs = df['pair'].astype(str).to_numpy()
+        years = df['year'].to_numpy(dtype=np.int64)
+        labels = df['month'].cat.codes.to_numpy(dtype=np.int64) + 1
+        rates = df['rate'].to_numpy(dtype=np.float64)
+    
+    order = np.lexsort((labels, years, pairs))
+    records = np.empty(len(order), dtype=[('label', '<i8'), ('rate', '<f8')])
+    records['label'] = labels[order]
+    records['rate'] = rates[order]
+    pairs, years = pairs[order], years[order]
+    
+    hashes = {}
+    starts = np.flatnonzero(np.r_[True, (pairs[1:] != pairs[:-1]) | (years[1:] != years[:-1])]) if len(order) else []
+    for start, end in zip(starts, list(starts[1:]) + [len(order)]):
+        hashes[f"{pairs[start]} {years[start]}"] = hashlib.sha256(records[start:end].tobytes()).hexdigest()
+    return hashes
+
+class OutputManifest:
+    """
+    Sidecar <output>.manifest.json with one SHA-256 per (pair, year)
+    
+    The output is only rewritten when the data hash differs from the one
+    recorded for it, so unchanged scheduled runs leave the file (and its
+    mtime) alone for downstream syncs. The hash of the file itself is kept
+    too, so a file edited by hand since it was written gets rewritten.
+    """
+    def __init__(self, output_path):
+        self.path = f"{output_path}.manifest.json"
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                self.data = json.load(f)
+        except (OSError, ValueError):
+            self.data = {}
+    
+    @staticmethod
+    def digest(cells, output_format):
+        """
+        Hash of a whole output: the format plus every cell digest
+        """
+        return hashlib.sha256(json.dumps([output_format, sorted(cells.items())]).encode()).hexdigest()
+    
+    def changed_cells(self, cells):
+        """
+        Cells that were added, removed or changed since the manifest was written
+        """
+        previous = self.data.get("cells", {})
+        return sorted(key for key in set(cells) | set(previous) if cells.get(key) != previous.get(key))
+    
+    @staticmethod
+    def file_digest(path):
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        return digest.hexdigest()
+    
+    def file_edited(self, output_path):
+        """
+        Whether output_path no longer holds the bytes recorded for it
+        """
+        recorded = self.data.get("file_sha256")
+        return recorded is not None and self.file_digest(output_path) != recorded
+    
+    def save(self, output_path, output_format, cells):
+        """
+        Record the hashes of the output that was just written
+        """
+        file_sha256 = self.file_digest(output_path)
+        self.data = {
+            "file": os.path.basename(output_path),
+            "format": output_format,
+            "sha256": self.digest(cells, output_format),
+            "file_sha256": file_sha256,
+            "updated_at": datetime.now().isoformat(timespec="seconds"),
+            "cells": dict(sorted(cells.items())),
+        }
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.data, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+def load_pairs(pairs=None, pairs_file=None):
+    """
+    Read currency pairs from a "USD:INR,EUR:GBP" string and/or a file with
+    one FROM:TO pair per line (blank lines and # comments are ignored)
+    """
+    entries = []
+    if pairs:
+        entries.extend(pairs.split(','))
+    if pairs_file:
+        with open(pairs_file, encoding="utf-8") as f:
+            for line in f:
+                line = line.split('#', 1)[0].strip()
+                if line:
+                    entries.extend(line.split(','))
+    
+    result = []
+    for entry in entries:
+        entry = entry.strip()
+        if not entry:
+            continue
+        if ':' not in entry:
+            raise ValueError(f"Invalid currency pair '{entry}', expected FROM:TO")
+        from_currency, to_currency = (part.strip().upper() for part in entry.split(':', 1))
+        if (from_currency, to_currency) not in result:
+            result.append((from_currency, to_currency))
+    
+    return result
+
+# --format value -> XRatesScraper method; Feather v2 is the Arrow IPC file format
+OUTPUT_WRITERS = {
+    'xlsx': 'save_to_excel',
+    'csv': 'save_to_csv',
+    'json': 'save_to_json',
+    'parquet': 'save_to_parquet',
+    'feather': 'save_to_feather',
+    'arrow': 'save_to_feather',
+}
+
+# Formats save_year_rates writes without pandas
+LITE_FORMATS = ('csv', 'json')
+
+# Frames with at least this many cells are written with a write-only workbook
+EXCEL_WRITE_ONLY_CELLS = 200_000
+
+def excel_styles():
+    """
+    Header font, header fill, centred alignment and bold font used in Excel exports
+    """
+    from openpyxl.styles import Font, PatternFill, Alignment
+    
+    header_font = Font(bold=True, color="FFFFFF")
+    header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
+    return header_font, header_fill, Alignment(horizontal="center"), Font(bold=True)
+
+def excel_column_widths(df, index=True, max_width=15):
+    """
+    Column letter -> width computed from the DataFrame one column at a time
+    """
+    from openpyxl.utils import get_column_letter
+    
+    lengths = []
+    if index:
+        labels = df.index.astype(str).str.len()
+        lengths.append(max(len('Month'), labels.max() if len(labels) else 0))
+    for column in df.columns:
+        values = df[column].astype(str).str.len()
+        lengths.append(max(len(str(column)), values.max() if len(values) else 0))
+    
+    return {get_column_letter(i + 1): min(int(length) + 2, max_width) for i, length in enumerate(lengths)}
+
+# Per-thread request context read by the instrumented connections below
+_request_context = threading.local()
+
+class Metrics:
+    """
+    Collects timing spans and counters for one scraper run
+    
+    Spans are durations of named phases (dns, connect, tls, rate_wait,
+    request, download, parse, fetch, assemble, write) tagged with the labels
+    of the surrounding context(). Only per-phase totals are kept unless
+    keep_events is set, so a long-running serve stays bounded; the totals
+    go to a Prometheus textfile and the kept spans to JSON lines.
+    """
+    def __init__(self, keep_events=False):
+        self.lock = threading.Lock()
+        self.events = [] if keep_events else None
+        self.totals = {}
+    
+    @contextmanager
+    def context(self, **labels):
+        """
+        Tag every span recorded on this thread with labels, and let the
+        connection hooks report DNS and connect time here
+        """
+        previous = getattr(_request_context, 'labels', None), getattr(_request_context, 'metrics', None)
+        _request_context.labels = {**(previous[0] or {}), **labels}
+        _request_context.metrics = self
+        try:
+            yield
+        finally:
+            _request_context.labels, _request_context.metrics = previous
+    
+    @contextmanager
+    def span(self, phase, **labels):
+        """
+        Time the enclosed block as one phase
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(phase, time.perf_counter() - started, **labels)
+    
+    def record(self, phase, seconds, **labels):
+        with self.lock:
+            if self.events is not None:
+                self.events.append({"ts": time.time(), "phase": phase, "seconds": seconds,
+                                    **(getattr(_request_context, 'labels', None) or {}), **labels})
+            count, total = self.totals.get(phase, (0, 0.0))
+            self.totals[phase] = (count + 1, total + seconds)
+    
+    def write_jsonl(self, path, counters=None):
+        """
+        Write one JSON object per kept span, then one with the counters
+        """
+        with open(path, "w", encoding="utf-8") as f:
+            for event in self.events or []:
+                f.write(json.dumps(event) + "\n")
+            f.write(json.dumps({"ts": time.time(), "phase": "counters", **(counters or {})}) + "\n")
+        return path
+    
+    def write_prometheus(self, path, counters=None):
+        """
+        Write a node_exporter textfile; the file is replaced atomically
+        """
+        lines = [
+            "# HELP xrates_phase_seconds Time spent per scraper phase",
+            "# TYPE xrates_phase_seconds summary",
+        ]
+        for phase, (count, total) in sorted(self.totals.items()):
+            lines.append(f'xrates_phase_seconds_sum{{phase="{phase}"}} {total:.6f}')
+            lines.append(f'xrates_phase_seconds_count{{phase="{phase}"}} {count}')
+        for name, value in sorted((counters or {}).items()):
+            lines.append(f"# TYPE xrates_{name}_total counter")
+            lines.append(f"xrates_{name}_total {value}")
+        lines.append("# TYPE xrates_last_run_timestamp_seconds gauge")
+        lines.append(f"xrates_last_run_timestamp_seconds {time.time():.0f}")
+        
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, path)
+        return path
+
+def _instrumented(connection_class):
+    """
+    Connection subclass that reports DNS, TCP connect and TLS handshake
+    time to the Metrics of the current request context
+    """
+    class InstrumentedConnection(connection_class):
+        def _new_conn(self):
+            metrics = getattr(_request_context, 'metrics', None)
+            if metrics is None or not hasattr(self, '_dns_host'):
+                return super()._new_conn()
+            
+            started = time.perf_counter()
+            dns_host = self._dns_host
+            try:
+                # Resolve once here, with the address families urllib3 allows
+                infos = socket.getaddrinfo(dns_host, self.port, allowed_gai_family(), socket.SOCK_STREAM)
+                addresses = list(dict.fromkeys(info[4][0] for info in infos))
+            except OSError:
+                # Let urllib3 resolve again and raise its own error
+                addresses = [dns_host]
+            resolved = time.perf_counter()
+            try:
+                # Try every address in order, as urllib3's create_connection
+                # does; TLS later still verifies against the original host name
+                for i, address in enumerate(addresses):
+                    self._dns_host = address
+                    try:
+                        return super()._new_conn()
+                    except (ConnectTimeoutError, NewConnectionError):
+                        if i == len(addresses) - 1:
+                            raise
+            finally:
+                self._dns_host = dns_host
+                metrics.record("dns", resolved - started, host=dns_host)
+                self._tcp_seconds = time.perf_counter() - started
+                metrics.record("connect", self._tcp_seconds - (resolved - started), host=dns_host)
+        
+        def connect(self):
+            self._tcp_seconds = None
+            started = time.perf_counter()
+            try:
+                return super().connect()
+            finally:
+                metrics = getattr(_request_context, 'metrics', None)
+                if metrics is not None and self._tcp_seconds is not None and isinstance(self, HTTPSConnection):
+                    metrics.record("tls", time.perf_counter() - started - self._tcp_seconds, host=self._dns_host)
+    
+    return InstrumentedConnection
+
+class InstrumentedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _instrumented(HTTPConnection)
+
+class InstrumentedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _instrumented(HTTPSConnection)
+
+@contextmanager
+def _requests_errors():
+    """
+    Re-raise httpx errors as their requests counterparts, so RetryPolicy
+    and the callers handle both transports alike
+    """
+    try:
+        yield
+    except httpx.TimeoutException as e:
+        raise requests.exceptions.Timeout(str(e)) from e
+    except httpx.TransportError as e:
+        raise requests.exceptions.ConnectionError(str(e)) from e
+    except httpx.DecodingError as e:
+        raise requests.exceptions.ContentDecodingError(str(e)) from e
+    except httpx.HTTPError as e:
+        raise requests.exceptions.RequestException(str(e)) from e
+
+class HttpxResponse:
+    """
+    The parts of a requests.Response the scraper reads, over an httpx response
+    
+    raw.tell() is the number of bytes received before decoding, like
+    urllib3's, so bytes_read counts what went over the wire.
+    """
+    def __init__(self, response, elapsed):
+        self._response = response
+        self.status_code = response.status_code
+        self.reason = response.reason_phrase
+        self.headers = response.headers
+        self.url = str(response.url)
+        self.http_version = response.http_version
+        self.elapsed = elapsed
+    
+    @property
+    def raw(self):
+        return self
+    
+    def tell(self):
+        return self._response.num_bytes_downloaded
+    
+    @property
+    def content(self):
+        with _requests_errors():
+            return self._response.read()
+    
+    def iter_content(self, chunk_size=1):
+        with _requests_errors():
+            yield from self._response.iter_bytes(chunk_size)
+    
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(f"{self.status_code} Error: {self.reason} for url: {self.url}",
+                                                response=self)
+    
+    def close(self):
+        self._response.close()
+
+class HttpxSession:
+    """
+    Stand-in for the scraper's requests.Session backed by one httpx.Client
+    
+    HTTP/2 is negotiated with ALPN on https URLs, so concurrent workers
+    share one multiplexed connection instead of a pool of HTTP/1.1 ones.
+    Accept-Encoding is left to httpx, which adds br and zstd when brotli
+    and zstandard are installed. prior_knowledge=True speaks HTTP/2 right
+    away over plain http (h2c), e.g. to a local fixture server.
+    Connection timings are not reported, as the pool is httpx's own.
+    """
+    def __init__(self, pool_size=10, http2=True, prior_knowledge=False):
+        if not module_available('httpx') or (http2 and not module_available('h2')):
+            raise ImportError("The httpx transport needs httpx and h2 (pip install 'httpx[http2]')")
+        headers = {name: value for name, value in DEFAULT_HEADERS.items()
+                   if name not in ('Accept-Encoding', 'Connection')}
+        limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+        self.client = httpx.Client(headers=headers, limits=limits, http2=http2, http1=not prior_knowledge,
+                                   follow_redirects=True)
+        # Responses per negotiated protocol, e.g. {"HTTP/2": 30}
+        self.http_versions = {}
+        self.lock = threading.Lock()
+    
+    @property
+    def headers(self):
+        return self.client.headers
+    
+    def get(self, url, timeout=None, headers=None, stream=False, **kwargs):
+        """
+        GET url like requests.Session.get; the body is read up front unless stream=True
+        """
+        with _requests_errors():
+            request = self.client.build_request("GET", url, headers=headers,
+                                                timeout=timeout if timeout is not None else httpx.USE_CLIENT_DEFAULT)
+            started = time.perf_counter()
+            response = self.client.send(request, stream=True)
+            response = HttpxResponse(response, timedelta(seconds=time.perf_counter() - started))
+        with self.lock:
+            self.http_versions[response.http_version] = self.http_versions.get(response.http_version, 0) + 1
+        if not stream:
+            response.content
+        return response
+    
+    def close(self):
+        self.client.close()
+
+# Requests/s of the fixed pauses between sequential pages (1 + 0.5 + 2 s)
+PAUSED_RATE = 1 / 3.5
+
+class RateLimiter:
+    """
+    Thread-safe token bucket shared by every worker talking to one host
+    
+    The rate adapts: slow_down() halves it when the server pushes back and
+    speed_up() creeps back towards the configured rate on healthy responses.
+    """
+    def __init__(self, rate=1.0, burst=1, min_rate=0.05):
+        self.rate = float(rate)
+        self.max_rate = float(rate)
+        self.min_rate = min(float(min_rate), self.rate)
+        self.capacity = max(1, int(burst))
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def acquire(self):
+        """
+        Block until a request token is available
+        """
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+    
+    def slow_down(self):
+        """
+        Halve the request rate after a 429/503
+        """
+        with self.lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            return self.rate
+    
+    def speed_up(self):
+        """
+        Raise the request rate a step towards the configured maximum
+        """
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+            return self.rate
+
+class RetryPolicy:
+    """
+    Retries transient failures with exponential backoff and jitter
+    
+    Retry-After is honoured on 429/503 as given, and those responses also
+    slow the shared rate limiter down. backoff_max only caps our own
+    backoff; a Retry-After longer than max_retry_after fails the request
+    instead of retrying before the server allows it. Counters are kept
+    for the end-of-run report. Only 2xx responses are handed back unread;
+    any other (a 304 or an error page) has its short body read first, so
+    a streamed request never keeps its connection out of the pool.
+    """
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+    THROTTLE_STATUSES = {429, 503}
+    
+    def __init__(self, max_retries=4, backoff_base=1.0, backoff_max=60.0, metrics=None, max_retry_after=600.0):
+        self.max_retries = max_retries
+        self.metrics = metrics
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_retry_after = max_retry_after
+        self.lock = threading.Lock()
+        self.counters = {"requests": 0, "retries": 0, "throttled": 0, "failures": 0}
+    
+    def _count(self, name):
+        with self.lock:
+            self.counters[name] += 1
+    
+    @staticmethod
+    def release(response):
+        """
+        Read the rest of a streamed response so its connection goes back to the pool
+        """
+        try:
+            response.content
+        except Exception:
+            response.close()
+    
+    def delay(self, attempt, response=None):
+        """
+        Seconds to wait before the next attempt; the server's Retry-After
+        when it sent one, exponential backoff with jitter otherwise
+        """
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after:
+                try:
+                    return max(0.0, float(retry_after))
+                except ValueError:
+                    try:
+                        retry_at = parsedate_to_datetime(retry_after).timestamp()
+                        return max(0.0, retry_at - time.time())
+                    except (TypeError, ValueError):
+                        pass
+        cap = min(self.backoff_max, self.backoff_base * 2 ** attempt)
+        return cap / 2 + random.uniform(0, cap / 2)
+    
+    def get(self, session, url, rate_limiter=None, **kwargs):
+        """
+        session.get(url) with retries; returns the final response or raises
+        the last connection error
+        """
+        for attempt in range(self.max_retries + 1):
+            if rate_limiter:
+                started = time.perf_counter()
+                rate_limiter.acquire()
+                if self.metrics:
+                    self.metrics.record("rate_wait", time.perf_counter() - started)
+            self._count("requests")
+            try:
+                response = session.get(url, **kwargs)
+                if self.metrics:
+                    # elapsed runs from sending to the parsed headers and so
+                    # includes any dns/connect/tls recorded for a new connection
+                    self.metrics.record("request", response.elapsed.total_seconds(), status=response.status_code)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if attempt == self.max_retries:
+                    self._count("failures")
+                    raise
+                wait = self.delay(attempt)
+                print(f"Retrying in {wait:.1f}s after {type(e).__name__} (attempt {attempt + 1}/{self.max_retries})")
+                self._count("retries")
+                time.sleep(wait)
+                continue
+            
+            if response.status_code in self.THROTTLE_STATUSES:
+                self._count("throttled")
+                if rate_limiter:
+                    rate_limiter.slow_down()
+            elif response.status_code < 400 and rate_limiter:
+                rate_limiter.speed_up()
+            
+            if response.status_code in self.RETRY_STATUSES:
+                if attempt == self.max_retries:
+                    self._count("failures")
+                    self.release(response)
+                    return response
+                wait = self.delay(attempt, response)
+                if self.max_retry_after is not None and wait > self.max_retry_after:
+                    print(f"Giving up after HTTP {response.status_code}: Retry-After of {wait:.0f}s "
+                          f"exceeds {self.max_retry_after:.0f}s")
+                    self._count("failures")
+                    self.release(response)
+                    return response
+                print(f"Retrying in {wait:.1f}s after HTTP {response.status_code} (attempt {attempt + 1}/{self.max_retries})")
+                self._count("retries")
+                self.release(response)
+                time.sleep(wait)
+                continue
+            
+            if not 200 <= response.status_code < 300:
+                self.release(response)
+            return response
+
+class ResponseCache:
+    """
+    On-disk cache of parsed year pages
+    
+    A year fetched after it was over never changes and is kept forever.
+    Anything else (the current year, or a past year fetched while it was
+    still running) is trusted for ttl seconds and then revalidated with a
+    conditional request.
+    """
+    def __init__(self, cache_dir=".xrates_cache", ttl=6 * 3600):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        os.makedirs(cache_dir, exist_ok=True)
+    
+    def _path(self, key):
+        digest = hashlib.sha1(json.dumps(key).encode()).hexdigest()
+        return os.path.join(self.cache_dir, f"{digest}.json")
+    
+    def get(self, key):
+        """
+        Return the stored entry for key, or None
+        """
+        try:
+            with open(self._path(key), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    
+    def put(self, key, data, headers=None):
+        """
+        Store parsed data along with the validators from the response headers
+        """
+        headers = headers or {}
+        entry = {
+            "key": key,
+            "data": data,
+            "fetched_at": time.time(),
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+        }
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+        return entry
+    
+    def touch(self, key, entry):
+        """
+        Mark an entry as fresh again after a 304 Not Modified
+        """
+        return self.put(key, entry["data"], {"ETag": entry.get("etag"),
+                                             "Last-Modified": entry.get("last_modified")})
+    
+    def is_fresh(self, entry, year):
+        """
+        Entries fetched after their year was over are always fresh (the rule
+        RateStore.stale_jobs uses), everything else only within the TTL
+        """
+        fetched_at = entry.get("fetched_at", 0)
+        if fetched_at >= datetime(year + 1, 1, 1).timestamp():
+            return True
+        return time.time() - fetched_at < self.ttl
+    
+    def conditional_headers(self, entry):
+        """
+        Build If-None-Match / If-Modified-Since headers for revalidation
+        """
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+class HttpArchive:
+    """
+    Compressed, content-addressed archive of raw x-rates responses
+    
+    Bodies are stored once per SHA-256 under objects/ab/<digest>.gz and
+    index.jsonl maps each request (path and query, so an archive recorded
+    against x-rates.com replays under any --base-url) to its body digest,
+    status and validators. Later records of the same request win.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.index_path = os.path.join(path, "index.jsonl")
+        self.lock = threading.Lock()
+        self.index = {}
+        self.recorded = 0
+        self.replayed = 0
+        os.makedirs(os.path.join(path, "objects"), exist_ok=True)
+        try:
+            with open(self.index_path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        self.index[record["key"]] = record
+        except FileNotFoundError:
+            pass
+    
+    @staticmethod
+    def request_key(url):
+        """
+        Archive key of a URL: its path and query
+        """
+        parts = urlparse(url)
+        return f"{parts.path}?{parts.query}" if parts.query else parts.path
+    
+    def _object_path(self, digest):
+        return os.path.join(self.path, "objects", digest[:2], f"{digest}.gz")
+    
+    def put(self, url, content, status=200, headers=None):
+        """
+        Store one response body and point the request's index entry at it
+        """
+        digest = hashlib.sha256(content).hexdigest()
+        path = self._object_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(gzip.compress(content, compresslevel=9, mtime=0))
+            os.replace(tmp_path, path)
+        
+        headers = headers or {}
+        record = {
+            "key": self.request_key(url),
+            "url": url,
+            "sha256": digest,
+            "status": status,
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+            "recorded_at": time.time(),
+        }
+        with self.lock:
+            with open(self.index_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+            self.index[record["key"]] = record
+            self.recorded += 1
+        return digest
+    
+    def get(self, url):
+        """
+        Return (content, headers) recorded for url, or None if it was never recorded
+        """
+        record = self.index.get(self.request_key(url))
+        if record is None:
+            return None
+        with open(self._object_path(record["sha256"]), "rb") as f:
+            content = gzip.decompress(f.read())
+        with self.lock:
+            self.replayed += 1
+        headers = {name: record[field] for name, field in (("ETag", "etag"), ("Last-Modified", "last_modified"))
+                   if record.get(field)}
+        return content, headers
+
+class RateStore:
+    """
+    SQLite file holding monthly average rates per pair and year
+    
+    Rows live in a WITHOUT ROWID table clustered on the composite key
+    (from_currency, to_currency, year, month_num). Point, range and history
+    lookups for a pair are therefore a single index seek. Each row
+    remembers when it was fetched, so a year fetched while it was still
+    running is known to need another pass.
+    """
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS rates (
+            from_currency TEXT NOT NULL,
+            to_currency TEXT NOT NULL,
+            year INTEGER NOT NULL,
+            month_num INTEGER NOT NULL,
+            month TEXT NOT NULL,
+            rate REAL NOT NULL,
+            fetched_at REAL NOT NULL,
+            PRIMARY KEY (from_currency, to_currency, year, month_num)
+        ) WITHOUT ROWID
+    """
+    
+    def __init__(self, path="exchange_rates.sqlite"):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self._migrate()
+        self.conn.execute(self.SCHEMA)
+        self.conn.commit()
+    
+    def _migrate(self):
+        """
+        Move rows from the original month-text keyed table to the current schema
+        """
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(rates)")]
+        if not columns or 'month_num' in columns:
+            return
+        month_case = " ".join(f"WHEN '{month}' THEN {i + 1}" for i, month in enumerate(MONTH_ORDER))
+        with self.conn:
+            self.conn.execute("ALTER TABLE rates RENAME TO rates_old")
+            self.conn.execute(self.SCHEMA)
+            self.conn.execute(
+                "INSERT OR REPLACE INTO rates SELECT from_currency, to_currency, year, "
+                f"CASE month {month_case} ELSE 0 END, month, rate, fetched_at FROM rates_old")
+            self.conn.execute("DROP TABLE rates_old")
+    
+    def close(self):
+        """
+        Close the SQLite connection
+        """
+        self.conn.close()
+    
+    def stale_jobs(self, pairs, start_year, end_year):
+        """
+        Return the (from_currency, to_currency, year) cells that are missing
+        or were fetched before their year was over
+        """
+        fetched = {}
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT from_currency, to_currency, year, MAX(fetched_at) FROM rates "
+                "WHERE year BETWEEN ? AND ? GROUP BY from_currency, to_currency, year",
+                (start_year, end_year)).fetchall()
+        for from_currency, to_currency, year, fetched_at in rows:
+            fetched[(from_currency, to_currency, year)] = fetched_at
+        
+        jobs = []
+        for from_currency, to_currency in pairs:
+            for year in range(start_year, end_year + 1):
+                fetched_at = fetched.get((from_currency, to_currency, year))
+                year_over = datetime(year + 1, 1, 1).timestamp()
+                if fetched_at is None or fetched_at < year_over:
+                    jobs.append((from_currency, to_currency, year))
+        return jobs
+    
+    def _write_rows(self, rows):
+        """
+        Upsert (from, to, year, month_num, month, rate, fetched_at) rows in one transaction
+        """
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT INTO rates VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (from_currency, to_currency, year, month_num) "
+                "DO UPDATE SET rate = excluded.rate, fetched_at = excluded.fetched_at",
+                rows)
+        return len(rows)
+    
+    def upsert(self, results):
+        """
+        Merge a (from_currency, to_currency, year) -> {month: rate} mapping
+        into the store
+        """
+        return self.upsert_records(RateRecords.from_results(results))
+    
+    def upsert_frame(self, tidy):
+        """
+        Merge a tidy frame (as built by build_tidy_frame) into the store
+        """
+        now = time.time()
+        rows = zip(tidy['from_currency'].astype(str), tidy['to_currency'].astype(str),
+                   tidy['year'].astype(int).tolist(), (tidy['month'].cat.codes + 1).tolist(),
+                   tidy['month'].astype(str), tidy['rate'].astype(float).tolist(),
+                   [now] * len(tidy))
+        return self._write_rows(list(rows))
+    
+    def upsert_records(self, records):
+        """
+        Merge RateRecords into the store straight from the structured array
+        """
+        now = time.time()
+        array = records.array
+        rows = [(*records.pairs[code], year, month_num, MONTH_ORDER[month_num - 1], rate, now)
+                for code, year, month_num, rate in zip(array['pair'].tolist(), array['year'].tolist(),
+                                                       array['month'].tolist(), array['rate'].tolist())]
+        return self._write_rows(rows)
+    
+    def load(self, pairs, start_year, end_year):
+        """
+        Read stored rates back as a (from_currency, to_currency, year) -> {month: rate} mapping
+        """
+        results = {}
+        with self.lock:
+            for from_currency, to_currency in pairs:
+                rows = self.conn.execute(
+                    "SELECT year, month, rate FROM rates "
+                    "WHERE from_currency = ? AND to_currency = ? AND year BETWEEN ? AND ?",
+                    (from_currency, to_currency, start_year, end_year)).fetchall()
+                for year, month, rate in rows:
+                    results.setdefault((from_currency, to_currency, year), {})[month] = rate
+        return results
+    
+    def pairs(self):
+        """
+        All (from_currency, to_currency) pairs in the store
+        """
+        with self.lock:
+            return self.conn.execute(
+                "SELECT DISTINCT from_currency, to_currency FROM rates ORDER BY 1, 2").fetchall()
+    
+    def rate(self, from_currency, to_currency, year, month):
+        """
+        Rate for one month (name like 'Jan' or number 1-12), or None
+        """
+        month_num = month if isinstance(month, int) else MONTH_ORDER.index(month) + 1
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT rate FROM rates WHERE from_currency = ? AND to_currency = ? "
+                "AND year = ? AND month_num = ?",
+                (from_currency, to_currency, year, month_num)).fetchone()
+        return row[0] if row else None
+    
+    def latest(self, from_currency, to_currency):
+        """
+        Most recent (year, month, rate) stored for a pair, or None
+        """
+        with self.lock:
+            return self.conn.execute(
+                "SELECT year, month, rate FROM rates WHERE from_currency = ? AND to_currency = ? "
+                "ORDER BY year DESC, month_num DESC LIMIT 1",
+                (from_currency, to_currency)).fetchone()
+    
+    def pair_history(self, from_currency, to_currency, start_year=None, end_year=None):
+        """
+        A pair's rates in time order as a NumPy structured array with
+        int16 year, uint8 month (1-12) and float64 rate fields
+        """
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT year, month_num, rate FROM rates WHERE from_currency = ? AND to_currency = ? "
+                "AND year BETWEEN ? AND ? ORDER BY year, month_num",
+                (from_currency, to_currency, start_year if start_year is not None else -32768,
+                 end_year if end_year is not None else 32767)).fetchall()
+        return np.array(rows, dtype=[('year', np.int16), ('month', np.uint8), ('rate', np.float64)])
+    
+    def load_records(self, pairs, start_year, end_year):
+        """
+        Read stored rates back as RateRecords, without a dict per page
+        """
+        records = RateRecords()
+        with self.lock:
+            for from_currency, to_currency in pairs:
+                records.add_rows(self.conn.execute(
+                    "SELECT from_currency, to_currency, year, month_num, rate FROM rates "
+                    "WHERE from_currency = ? AND to_currency = ? AND year BETWEEN ? AND ?",
+                    (from_currency, to_currency, start_year, end_year)))
+        return records
+    
+    def query_range(self, from_currency, to_currency, start_year, end_year):
+        """
+        A pair's rates between two years as a tidy DataFrame
+        """
+        return self.load_records([(from_currency, to_currency)], start_year, end_year).to_frame()
+
+class RateSource(ABC):
+    """
+    Where XRatesScraper.run_jobs gets its monthly averages from
+    
+    The default (source=None) scrapes one x-rates page per pair and year.
+    A source replaces that with fetch_jobs(scraper, jobs), which takes
+    (from_currency, to_currency, year) jobs and returns ({job: {month: rate}
+    or None}, {job: seconds}), the same shape as run_jobs. It may use the
+    scraper's session, retry policy, rate limiter, metrics and archives.
+    """
+    @abstractmethod
+    def fetch_jobs(self, scraper, jobs):
+        """
+        Monthly averages and seconds spent for each job
+        """
+
+class BulkFileSource(RateSource):
+    """
+    Monthly averages computed from one bulk daily history file
+    
+    Reads a central-bank style file in one request: a wide CSV (Date plus
+    one column per currency, rates per 1 unit of base), an ECB style XML
+    of nested <Cube time=..><Cube currency=.. rate=../></Cube>, or a ZIP
+    holding either. location is an http(s) URL or a local path. Daily
+    cross rates are divided out of the base rates and averaged per month
+    with one groupby, rounded to the 6 decimals x-rates publishes.
+    """
+    # Downloads larger than this spill from memory to a temporary file
+    SPOOL_SIZE = 8 * 1024 * 1024
+    
+    def __init__(self, location, base="EUR", file_format=None):
+        self.location = location
+        self.base = base.upper()
+        self.file_format = file_format
+        self.lock = threading.Lock()
+        self.daily = None
+    
+    def _read(self, scraper):
+        """
+        Binary file object with the bulk file, through the archive or network
+        when it is a URL; downloads are streamed into a spooled temporary file
+        instead of being held in memory
+        """
+        if not self.location.startswith(("http://", "https://")):
+            return open(self.location, "rb")
+        if scraper.replay_archive:
+            recorded = scraper.replay_archive.get(self.location)
+            if recorded is None:
+                raise LookupError(f"{self.location} is not in the replay archive")
+            return io.BytesIO(recorded[0])
+        
+        print(f"Downloading bulk rate file {self.location}...")
+        response = scraper.retry_policy.get(scraper.session, self.location, scraper.rate_limiter,
+                                            timeout=60, stream=True)
+        response.raise_for_status()
+        body = tempfile.SpooledTemporaryFile(max_size=self.SPOOL_SIZE)
+        try:
+            for chunk in response.iter_content(chunk_size=65536):
+                body.write(chunk)
+        except BaseException:
+            body.close()
+            raise
+        finally:
+            response.close()
+        body.seek(0)
+        if scraper.record_archive:
+            scraper.record_archive.put(self.location, body.read(), response.status_code, response.headers)
+            body.seek(0)
+        return body
+    
+    def _detect_format(self, f):
+        if self.file_format:
+            return self.file_format
+        head = f.read(64)
+        f.seek(0)
+        if head[:4] == b"PK\x03\x04":
+            return "zip"
+        return "xml" if head.lstrip()[:1] == b"<" else "csv"
+    
+    def parse(self, content, file_format=None):
+        """
+        Parse a bulk file (bytes or a binary file object) into a date x
+        currency frame of base rates, including a constant 1.0 column for
+        the base itself
+        """
+        f = io.BytesIO(content) if isinstance(content, (bytes, bytearray)) else content
+        file_format = file_format or self._detect_format(f)
+        if file_format == "zip":
+            with zipfile.ZipFile(f) as archive:
+                name = next((n for n in archive.namelist() if n.lower().endswith((".csv", ".xml"))), None)
+                if name is None:
+                    raise ValueError(f"No CSV or XML file in {self.location}")
+                with archive.open(name) as member:
+                    return self.parse(member, name.rsplit(".", 1)[-1].lower())
+        
+        if file_format == "xml":
+            daily = self._parse_xml(f)
+        else:
+            daily = pd.read_csv(f, na_values=["N/A", "-", ""], skipinitialspace=True)
+            daily = daily.loc[:, ~daily.columns.str.startswith("Unnamed")]
+            daily = daily.rename(columns={daily.columns[0]: "Date"})
+            daily.index = pd.to_datetime(daily.pop("Date"))
+            daily.columns = daily.columns.str.strip().str.upper()
+            daily = daily.apply(pd.to_numeric, errors="coerce")
+        
+        daily[self.base] = 1.0
+        return daily.sort_index()
+    
+    def _parse_xml(self, f):
+        """
+        Stream an ECB style Cube file with iterparse, clearing each day as it is read
+        """
+        dates, currencies, rates = [], [], []
+        day = None
+        for event, element in ElementTree.iterparse(f, events=("start", "end")):
+            if not element.tag.endswith("Cube"):
+                continue
+            if event == "start" and "time" in element.attrib:
+                day = element.attrib["time"]
+            elif event == "end" and "currency" in element.attrib:
+                dates.append(day)
+                currencies.append(element.attrib["currency"].upper())
+                rates.append(float(element.attrib["rate"]))
+            elif event == "end" and "time" in element.attrib:
+                element.clear()
+        
+        long = pd.DataFrame({"date": pd.to_datetime(dates), "currency": currencies, "rate": rates})
+        daily = long.pivot(index="date", columns="currency", values="rate")
+        daily.columns.name = None
+        return daily
+    
+    def daily_rates(self, scraper):
+        """
+        The parsed daily frame; downloaded and parsed once per source
+        """
+        with self.lock:
+            if self.daily is None:
+                with scraper.metrics.span("download", source="bulk"):
+                    body = self._read(scraper)
+                with body:
+                    size = body.seek(0, os.SEEK_END)
+                    body.seek(0)
+                    with scraper.metrics.span("parse", source="bulk", bytes=size):
+                        self.daily = self.parse(body)
+                print(f"Loaded {len(self.daily)} days x {len(self.daily.columns)} currencies "
+                      f"({self.daily.index.min().date()} to {self.daily.index.max().date()})")
+            return self.daily
+    
+    def monthly_averages(self, scraper, pairs):
+        """
+        (year, month) x "FROM/TO" frame of monthly average cross rates
+        """
+        daily = self.daily_rates(scraper)
+        pairs = [pair for pair in pairs if pair[0] in daily.columns and pair[1] in daily.columns]
+        if not pairs:
+            return pd.DataFrame()
+        from_rates = daily[[from_currency for from_currency, _ in pairs]].to_numpy()
+        to_rates = daily[[to_currency for _, to_currency in pairs]].to_numpy()
+        cross = pd.DataFrame(to_rates / from_rates, index=daily.index,
+                             columns=[f"{from_currency}/{to_currency}" for from_currency, to_currency in pairs])
+        return cross.groupby([daily.index.year, daily.index.month]).mean().round(6)
+    
+    def fetch_jobs(self, scraper, jobs):
+        started = time.perf_counter()
+        pairs = list(dict.fromkeys((from_currency, to_currency) for from_currency, to_currency, _ in jobs))
+        with scraper.metrics.span("aggregate", source="bulk"):
+            monthly = self.monthly_averages(scraper, pairs)
+        
+        missing = [f"{f}/{t}" for f, t in pairs if f"{f}/{t}" not in monthly.columns]
+        if missing:
+            print(f"Warning: {self.location} has no rates for {', '.join(missing)}")
+        
+        results = {}
+        for job in jobs:
+            from_currency, to_currency, year = job
+            pair = f"{from_currency}/{to_currency}"
+            if pair not in monthly.columns:
+                results[job] = None
+                continue
+            rows = monthly[pair].loc[monthly.index.get_level_values(0) == year].dropna()
+            results[job] = {MONTH_ORDER[month - 1]: float(rate) for (_, month), rate in rows.items()} or None
+        
+        elapsed = time.perf_counter() - started
+        return results, {job: elapsed / max(1, len(jobs)) for job in jobs}
 
 class XRatesScraper:
-    def __init__(self, base_url="https://www.x-rates.com/average/"):
+    def __init__(self, base_url="https://www.x-rates.com/average/", rate_limiter=None, pool_size=10,
+                 cache=None, refresh_years=(), stream=False, retry_policy=None, metrics=None,
+                 pipeline_depth=2, record_archive=None, replay_archive=None, source=None, transport="requests",
+                 http2_prior_knowledge=False, pauses=None):
+        self.base_url = base_url
+        # RateSource that replaces the per-year page scraping in run_jobs
+        self.source = source
+        # HttpArchive that every downloaded page is saved to, and one that
+        # replaces the network entirely
+        self.record_archive = record_archive
+        self.replay_archive = replay_archive
+        # Pages downloaded ahead of the parser in sequential runs; 0 disables pipelining
+        self.pipeline_depth = pipeline_depth
+        self.metrics = metrics or Metrics()
+        self.retry_policy = retry_policy or RetryPolicy()
+        if self.retry_policy.metrics is None:
+            self.retry_policy.metrics = self.metrics
+        # Stream mode stops reading a page once the rate list has arrived
+        self.stream = stream
+        self.bytes_read = 0
+        self.bytes_saved = 0
+        # Pages cut short without a Content-Length, whose skipped size is unknown
+        self.unsized_stops = 0
+        self.stats_lock = threading.Lock()
+        # When a limiter is set it replaces the fixed pauses between requests,
+        # unless pauses=True keeps them and the limiter only adds slow-downs
+        self.rate_limiter = rate_limiter
+        self.pauses = rate_limiter is None if pauses is None else pauses
+        self.cache = cache
+        # Years that skip the freshness check and always go to the network
+        self.refresh_years = set(refresh_years)
+        self.cache_hits = 0
+        self.year_timings = {}
+        # {"written": bool, "changed": [cells]} after an if_changed write
+        self.last_write = None
+        # "httpx" swaps the requests session for HTTP/2 with brotli/zstd (see
+        # HttpxSession); http2_prior_knowledge makes it speak h2c on http URLs
+        self.transport = transport
+        if transport == "httpx":
+            self.session = HttpxSession(pool_size, prior_knowledge=http2_prior_knowledge)
+        else:
+            self.session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            adapter.poolmanager.pool_classes_by_scheme = {
+                'http': InstrumentedHTTPConnectionPool,
+                'https': InstrumentedHTTPSConnectionPool,
+            }
+            self.session.mount('https://', adapter)
+            self.session.mount('http://', adapter)
+            self.session.headers.update(DEFAULT_HEADERS)
+    
+    def get_year_data(self, year, from_currency="USD", to_currency="INR", amount=1, refresh=False):
+        """
+        Fetch exchange rate data for a specific year
+        
+        refresh=True revalidates a cached page even if it is still fresh.
+        """
+        with self.metrics.context(pair=f"{from_currency}/{to_currency}", year=year), self.metrics.span("fetch"):
+            return self._get_year_data(year, from_currency, to_currency, amount, refresh)
+    
+    def _get_year_data(self, year, from_currency, to_currency, amount, refresh=False):
+        year_data, page = self.fetch_year_page(year, from_currency, to_currency, amount, refresh)
+        if page is None:
+            return year_data
+        return self.parse_year_page(year, page)
+    
+    def fetch_year_page(self, year, from_currency="USD", to_currency="INR", amount=1, refresh=False):
+        """
+        Network half of get_year_data
+        
+        Returns (year_data, None) when the answer is already known (cache
+        hit, 304 or error) and (None, page) when page still has to go
+        through parse_year_page.
+        """
+        url = f"{self.base_url}?from={from_currency}&to={to_currency}&amount={amount}&year={year}"
+        
+        cache_key = [self.base_url, from_currency, to_currency, amount, year]
+        if self.replay_archive:
+            recorded = self.replay_archive.get(url)
+            if recorded is None:
+                print(f"Year {year} is not in the replay archive")
+                return None, None
+            print(f"Replaying data for year {year}")
+            return None, (recorded[0], recorded[1], cache_key)
+        
+        entry = self.cache.get(cache_key) if self.cache else None
+        if entry and not refresh and year not in self.refresh_years and self.cache.is_fresh(entry, year):
+            print(f"Using cached data for year {year}")
+            self.cache_hits += 1
+            return entry["data"], None
+        
+        try:
+            print(f"Fetching data for year {year}...")
+            headers = self.cache.conditional_headers(entry) if entry else None
+            # Always stream so the body download can be timed apart from TTFB
+            response = self.retry_policy.get(self.session, url, self.rate_limiter, timeout=10,
+                                             headers=headers, stream=True)
+            
+            if response.status_code == 304 and entry:
+                print(f"Data for year {year} not modified, using cache")
+                self.cache.touch(cache_key, entry)
+                return entry["data"], None
+            
+            response.raise_for_status()
+            
+            # Wait a bit to be respectful to the server
+            if self.pauses:
+                time.sleep(1)
+            
+            started = time.perf_counter()
+            # A recorded page must be complete, or replays would serve it cut short
+            if self.stream and not self.record_archive:
+                content = self._read_until_rates(response)
+            else:
+                content = response.content
+                with self.stats_lock:
+                    self.bytes_read += response.raw.tell() or len(content)
+            self.metrics.record("download", time.perf_counter() - started, bytes=len(content))
+            if self.record_archive:
+                self.record_archive.put(url, content, response.status_code, response.headers)
+            
+            # Wait a bit more to ensure all content is loaded
+            if self.pauses:
+                time.sleep(0.5)
+            
+            return None, (content, response.headers, cache_key)
+            
+        except requests.exceptions.RequestException as e:
+            print(f"Error fetching data for year {year}: {e}")
+            return None, None
+        except Exception as e:
+            print(f"Error parsing data for year {year}: {e}")
+            return None, None
+    
+    def parse_year_page(self, year, page):
+        """
+        CPU half of get_year_data: parse a page from fetch_year_page and cache the result
+        """
+        content, headers, cache_key = page
+        try:
+            with self.metrics.span("parse"):
+                year_data = parse_average_rates(content)
+            
+            if year_data is None:
+                print(f"Warning: Could not find OutputLinksAvg class for year {year}")
+                return None
+            
+            if self.cache:
+                self.cache.put(cache_key, year_data, headers)
+            
+            print(f"Successfully fetched {len(year_data)} months for year {year}")
+            return year_data
+            
+        except Exception as e:
+            print(f"Error parsing data for year {year}: {e}")
+            return None
+    
+    def _read_until_rates(self, response, chunk_size=16384):
+        """
+        Read a streamed response until ul.OutputLinksAvg is closed, then drop
+        the connection instead of downloading the rest of the page
+        """
+        buffer = bytearray()
+        marker = -1
+        complete = False
+        try:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                # Overlap the previous chunk so a marker split across chunks is found
+                search_from = max(0, len(buffer) - 16)
+                buffer += chunk
+                if marker == -1:
+                    marker = buffer.find(b'OutputLinksAvg', search_from)
+                    if marker == -1:
+                        continue
+                    search_from = marker
+                if buffer.find(b'</ul>', max(search_from, marker)) != -1:
+                    complete = True
+                    break
+            # urllib3 doesn't count chunked bodies; the decoded size is close enough
+            wire_bytes = response.raw.tell() or len(buffer)
+        finally:
+            response.close()
+        
+        saved = 0
+        unsized = False
+        content_length = response.headers.get('Content-Length')
+        if complete and content_length and content_length.isdigit():
+            saved = max(0, int(content_length) - wire_bytes)
+        elif complete:
+            # Chunked responses don't say how much was left unread
+            unsized = True
+        with self.stats_lock:
+            self.bytes_read += wire_bytes
+            self.bytes_saved += saved
+            self.unsized_stops += unsized
+        
+        return bytes(buffer)
+    
+    def _timed_job(self, job, refresh=False):
+        """
+        Fetch one (from_currency, to_currency, year) job and return (job, data, elapsed seconds)
+        """
+        from_currency, to_currency, year = job
+        started = time.perf_counter()
+        year_data = self.get_year_data(year, from_currency, to_currency, refresh=refresh)
+        return job, year_data, time.perf_counter() - started
+    
+    def run_jobs(self, jobs, workers=1, sink=None, refresh=False):
+        """
+        Fetch (from_currency, to_currency, year) jobs through one scheduler
+        
+        All jobs share this scraper's session, connection pool and rate
+        limiter. With workers > 1 they run on a thread pool paced by the
+        limiter instead of fixed sleeps. Returns ({job: data}, {job: seconds}).
+        With sink, each page's data is handed to sink(job, data) as soon as
+        it is parsed instead of being kept, and the data dict stays empty.
+        refresh=True revalidates every cached page instead of trusting it.
+        """
+        jobs = list(jobs)
+        results = {}
+        collect = sink or results.__setitem__
+        if self.source is not None:
+            fetched, timings = self.source.fetch_jobs(self, jobs)
+            for job, year_data in fetched.items():
+                collect(job, year_data)
+            return results, timings
+        
+        timings = {}
+        
+        if workers > 1:
+            if self.rate_limiter is None or self.pauses:
+                self.rate_limiter = RateLimiter()
+                self.pauses = False
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(self._timed_job, job, refresh) for job in jobs]
+                for future in as_completed(futures):
+                    job, year_data, elapsed = future.result()
+                    collect(job, year_data)
+                    timings[job] = elapsed
+        elif self.pipeline_depth > 0 and len(jobs) > 1:
+            return results, self._pipelined_jobs(jobs, collect, refresh)
+        else:
+            for job in jobs:
+                cache_hits = self.cache_hits
+                job, year_data, elapsed = self._timed_job(job, refresh)
+                collect(job, year_data)
+                timings[job] = elapsed
+                
+                # Be respectful to the server
+                if self.pauses and not self.replay_archive and self.cache_hits == cache_hits:
+                    time.sleep(2)
+        
+        return results, timings
+    
+    def _pipelined_jobs(self, jobs, collect, refresh=False):
+        """
+        Sequential run_jobs with downloads overlapping parsing
+        
+        One producer thread fetches the pages in order, with the same
+        pauses between requests as the plain loop, and hands them over a
+        queue of at most pipeline_depth pages. This thread parses and
+        caches them, so page N is parsed while page N+1 downloads. Parsed
+        data goes to collect(job, data); returns {job: seconds}.
+        """
+        pages = queue.Queue(maxsize=self.pipeline_depth)
+        stopped = threading.Event()
+        done = object()
+        
+        def hand_over(item):
+            while not stopped.is_set():
+                try:
+                    pages.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+        
+        def produce():
+            try:
+                for job in jobs:
+                    from_currency, to_currency, year = job
+                    started = time.perf_counter()
+                    cache_hits = self.cache_hits
+                    with self.metrics.context(pair=f"{from_currency}/{to_currency}", year=year):
+                        fetched = self.fetch_year_page(year, from_currency, to_currency, refresh=refresh)
+                    if not hand_over((job, started, fetched)):
+                        return
+                    
+                    # Be respectful to the server
+                    if (self.pauses and not self.replay_archive
+                            and self.cache_hits == cache_hits and job != jobs[-1]):
+                        time.sleep(2)
+            finally:
+                hand_over(done)
+        
+        producer = threading.Thread(target=produce, name="page-fetcher", daemon=True)
+        producer.start()
+        
+        timings = {}
+        try:
+            while True:
+                item = pages.get()
+                if item is done:
+                    break
+                job, started, (year_data, page) = item
+                from_currency, to_currency, year = job
+                with self.metrics.context(pair=f"{from_currency}/{to_currency}", year=year):
+                    if page is not None:
+                        year_data = self.parse_year_page(year, page)
+                    elapsed = time.perf_counter() - started
+                    self.metrics.record("fetch", elapsed)
+                collect(job, year_data)
+                timings[job] = elapsed
+        finally:
+            stopped.set()
+            producer.join()
+        
+        return timings
+    
+    def scrape_multiple_years(self, start_year, end_year=None, from_currency="USD", to_currency="INR", workers=1):
+        """
+        Scrape data for multiple years and return as DataFrame
+        
+        With workers > 1 the years are fetched on a thread pool and paced by
+        the shared rate limiter instead of fixed sleeps. With one worker the
+        next year downloads while the previous one is parsed (see
+        pipeline_depth). Per-year fetch times are kept in self.year_timings.
+        """
+        if end_year is None:
+            end_year = datetime.now().year
+        
+        jobs = [(from_currency, to_currency, year) for year in range(start_year, end_year + 1)]
+        results, timings = self.run_jobs(jobs, workers)
+        self.year_timings = {job[2]: elapsed for job, elapsed in timings.items()}
+        
+        with self.metrics.span("assemble"):
+            return build_rates_frame({job[2]: year_data for job, year_data in results.items()})
+    
+    def scrape_pairs(self, pairs, start_year, end_year=None, workers=1):
+        """
+        Scrape every (pair, year) combination and return one tidy DataFrame
+        
+        The frame has one row per pair, year and month. Fetch times are kept
+        in self.job_timings keyed by (from_currency, to_currency, year).
+        """
+        if end_year is None:
+            end_year = datetime.now().year
+        
+        records = self.scrape_pair_records(pairs, start_year, end_year, workers)
+        with self.metrics.span("assemble"):
+            return records.to_frame()
+    
+    def scrape_pair_records(self, pairs, start_year, end_year, workers=1):
+        """
+        scrape_pairs without the final frame: the scraped rates as RateRecords
+        """
+        jobs = [(from_currency, to_currency, year)
+                for from_currency, to_currency in pairs
+                for year in range(start_year, end_year + 1)]
+        records = RateRecords()
+        _, self.job_timings = self.run_jobs(jobs, workers, sink=records.add)
+        return records
+    
+    def scrape_cross_rates(self, currencies, anchor="USD", start_year=None, end_year=None, workers=1,
+                           drift_sample=0, store=None):
+        """
+        Scrape only anchor/X for each currency and derive every other pair
+        
+        N currencies cost N - 1 pages per year instead of N * (N - 1). With
+        drift_sample > 0 that many non-anchor pairs are also scraped directly,
+        and the derived values are compared in self.cross_drift.
+        """
+        if end_year is None:
+            end_year = datetime.now().year
+        if start_year is None:
+            start_year = end_year
+        
+        anchor_pairs = [(anchor, currency) for currency in currencies if currency != anchor]
+        if store:
+            anchor_tidy = self.update_store(store, anchor_pairs, start_year, end_year, workers).to_frame()
+        else:
+            anchor_tidy = self.scrape_pairs(anchor_pairs, start_year, end_year, workers)
+        with self.metrics.span("assemble", mode="cross"):
+            derived = derive_cross_rates(anchor_tidy, anchor, currencies)
+        
+        self.cross_drift = None
+        crosses = [(a, b) for a in currencies for b in currencies if a != b and anchor not in (a, b)]
+        if drift_sample and crosses:
+            sample = random.Random(0).sample(crosses, min(drift_sample, len(crosses)))
+            print(f"Scraping {len(sample)} pairs directly to check drift")
+            jobs = [(a, b, year) for a, b in sample for year in range(start_year, end_year + 1)]
+            direct = RateRecords()
+            self.run_jobs(jobs, workers, sink=direct.add)
+            self.cross_drift = cross_rate_drift(derived, direct.to_frame())
+        
+        return derived
+    
+    def update_store(self, store, pairs, start_year, end_year=None, workers=1):
+        """
+        Fetch only the cells the store is missing or that may still change,
+        merge them in and return the stored data for the whole range as
+        RateRecords
+        
+        Stale cells bypass a fresh disk cache entry (they are revalidated),
+        since the upsert stamps them as fetched now and a cached partial year
+        would otherwise be stored as final. Pages go straight into
+        RateRecords, without a dict per page.
+        """
+        if end_year is None:
+            end_year = datetime.now().year
+        
+        jobs = store.stale_jobs(pairs, start_year, end_year)
+        total = len(pairs) * (end_year - start_year + 1)
+        print(f"{len(jobs)} of {total} (pair, year) cells need fetching")
+        
+        fetched = RateRecords()
+        _, self.job_timings = self.run_jobs(jobs, workers, sink=fetched.add, refresh=True)
+        self.year_timings = {job[2]: elapsed for job, elapsed in self.job_timings.items()}
+        rows = store.upsert_records(fetched)
+        print(f"Merged {rows} monthly rates into {store.path}")
+        
+        return store.load_records(pairs, start_year, end_year)
+    
+    def _default_filename(self, from_currency, to_currency, extension, stamped=True):
+        """
+        Timestamped output name; from_currency=None means a multi-pair file.
+        stamped=False gives the stable name used by if_changed writes.
+        """
+        suffix = datetime.now().strftime("_%Y%m%d_%H%M%S") if stamped else ""
+        if from_currency is None:
+            return f"exchange_rates_pairs{suffix}.{extension}"
+        return f"exchange_rates_{from_currency}_to_{to_currency}{suffix}.{extension}"
+    
+    def _write_if_changed(self, filename, output_format, cells, write):
+        """
+        Run write(path, display_name) into a temporary file and move it over
+        filename, unless the manifest shows the same data was written there
+        already; the writer reports filename as display_name
+        """
+        manifest = OutputManifest(filename)
+        if manifest.data.get("sha256") == OutputManifest.digest(cells, output_format) and os.path.exists(filename):
+            if not manifest.file_edited(filename):
+                print(f"No rates changed since {manifest.data.get('updated_at')}; kept {filename}")
+                self.last_write = {"written": False, "changed": []}
+                return filename
+            print(f"{filename} was edited since {manifest.data.get('updated_at')}; rewriting it")
+        
+        changed = manifest.changed_cells(cells)
+        root, extension = os.path.splitext(filename)
+        tmp_path = f"{root}.partial{extension}"
+        if write(tmp_path, filename) is None:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return None
+        os.replace(tmp_path, filename)
+        manifest.save(filename, output_format, cells)
+        
+        shown = ", ".join(changed[:5]) + (f" and {len(changed) - 5} more" if len(changed) > 5 else "")
+        if changed:
+            print(f"Wrote {filename}; {len(changed)} (pair, year) cells changed: {shown}")
+        else:
+            print(f"Wrote {filename}; no (pair, year) cells changed")
+        self.last_write = {"written": True, "changed": changed}
+        return filename
+    
+    def _columnar_frame(self, df, index):
+        """
+        Flatten the month x year frame into string-named columns for Arrow
+        based formats; tidy frames are passed through untouched
+        """
+        if not index:
+            return df
+        flat = df.rename(columns=str)
+        flat.index.name = 'Month'
+        return flat.reset_index()
+    
+    def save_output(self, df, output_format="xlsx", filename=None, from_currency="USD", to_currency="INR", index=True,
+                    if_changed=False, analytics=None, **options):
+        """
+        Save DataFrame with the writer registered for output_format
+        
+        Extra keyword options are passed to the writer (e.g. write_only for xlsx).
+        With if_changed the file gets a stable default name and is only
+        replaced when its rates differ from the sidecar manifest. With
+        analytics (the RateAnalytics of df) its figures are written too:
+        as extra sheets for xlsx, as extra columns of the tidy frame otherwise.
+        """
+        writer = OUTPUT_WRITERS.get(output_format)
+        if writer is None:
+            print(f"Unknown output format: {output_format}")
+            return None
+        writer = getattr(self, writer)
+        self.last_write = None
+        with self.metrics.span("write", format=output_format):
+            cells = content_hashes(df, index, f"{from_currency}/{to_currency}") if if_changed else None
+            manifest_format = output_format
+            if analytics is not None:
+                manifest_format = f"{output_format}+{analytics.settings}"
+                if output_format == 'xlsx':
+                    options['extra_sheets'] = analytics.sheets()
+                else:
+                    df, index = analytics.monthly, False
+            
+            # The default name's extension is the requested format (.arrow for arrow)
+            if filename is None:
+                filename = self._default_filename(from_currency, to_currency, output_format, stamped=not if_changed)
+            if not if_changed:
+                return writer(df, filename, from_currency, to_currency, index, **options)
+            return self._write_if_changed(filename, manifest_format, cells,
+                                          lambda path, name: writer(df, path, from_currency, to_currency, index,
+                                                                    display_name=name, **options))
+    
+    def metric_counters(self):
+        """
+        Run-wide counters exported next to the timing spans
+        """
+        return {
+            **self.retry_policy.counters,
+            "cache_hits": self.cache_hits,
+            "bytes_read": self.bytes_read,
+            "bytes_saved": self.bytes_saved,
+            "unsized_stops": self.unsized_stops,
+        }
+    
+    def save_to_csv(self, df, filename=None, from_currency="USD", to_currency="INR", index=True, display_name=None):
+        """
+        Save DataFrame to CSV file
+        """
+        if filename is None:
+            filename = self._default_filename(from_currency, to_currency, "csv")
+        
+        try:
+            if index:
+                df.to_csv(filename, index_label='Month')
+            else:
+                df.to_csv(filename, index=False)
+            print(f"Data saved successfully to {display_name or filename}")
+            return filename
+        except Exception as e:
+            print(f"Error saving to CSV: {e}")
+            return None
+    
+    def save_to_json(self, df, filename=None, from_currency="USD", to_currency="INR", index=True, display_name=None):
+        """
+        Save DataFrame to JSON: {year: {month: rate}} for the month x year
+        frame, a list of row objects for tidy frames
+        """
+        if filename is None:
+            filename = self._default_filename(from_currency, to_currency, "json")
+        
+        try:
+            if index:
+                with open(filename, 'w', encoding='utf-8') as f:
+                    json.dump({str(year): column.dropna().to_dict() for year, column in df.items()}, f, indent=2)
+            else:
+                df.to_json(filename, orient='records', date_format='iso', double_precision=15, indent=2)
+            print(f"Data saved successfully to {display_name or filename}")
+            return filename
+        except Exception as e:
+            print(f"Error saving to JSON: {e}")
+            return None
+    
+    def save_year_rates(self, results, output_format="csv", filename=None, from_currency="USD", to_currency="INR",
+                        if_changed=False):
+        """
+        Write a year -> {month: rate} mapping as CSV or JSON with the
+        standard library only
+        
+        Produces the same files as save_to_csv / save_to_json on the
+        build_rates_frame of results, without loading pandas. if_changed
+        works as in save_output.
+        """
+        if output_format not in LITE_FORMATS:
+            print(f"Format {output_format} needs pandas; use save_output")
+            return None
+        self.last_write = None
+        if not if_changed:
+            return self._write_year_rates(results, output_format, filename or
+                                          self._default_filename(from_currency, to_currency, output_format))
+        
+        filename = filename or self._default_filename(from_currency, to_currency, output_format, stamped=False)
+        cells = year_rates_hashes(results, f"{from_currency}/{to_currency}")
+        return self._write_if_changed(filename, output_format, cells,
+                                      lambda path, name: self._write_year_rates(results, output_format, path, name))
+    
+    def _write_year_rates(self, results, output_format, filename, display_name=None):
+        years, rows = rates_table(results)
+        try:
+            with self.metrics.span("write", format=output_format), open(filename, 'w', encoding='utf-8', newline='') as f:
+                if output_format == 'csv':
+                    writer = csv.writer(f, lineterminator='\n')
+                    writer.writerow(['Month'] + years)
+                    writer.writerows([['' if rate is None else rate for rate in row] for row in rows])
+                else:
+                    json.dump({str(year): {row[0]: row[i] for row in rows if row[i] is not None}
+                               for i, year in enumerate(years, 1)}, f, indent=2)
+            print(f"Data saved successfully to {display_name or filename}")
+            return filename
+        except Exception as e:
+            print(f"Error saving to {output_format.upper()}: {e}")
+            return None
+    
+    def save_to_parquet(self, df, filename=None, from_currency="USD", to_currency="INR", index=True,
+                        display_name=None):
+        """
+        Save DataFrame to Parquet file (needs pyarrow)
+        """
+        if filename is None:
+            filename = self._default_filename(from_currency, to_currency, "parquet")
+        
+        try:
+            self._columnar_frame(df, index).to_parquet(filename, index=False)
+            print(f"Data saved successfully to {display_name or filename}")
+            return filename
+        except Exception as e:
+            print(f"Error saving to Parquet: {e}")
+            return None
+    
+    def save_to_feather(self, df, filename=None, from_currency="USD", to_currency="INR", index=True,
+                        display_name=None):
+        """
+        Save DataFrame to a Feather v2 / Arrow IPC file (needs pyarrow)
+        """
+        if filename is None:
+            filename = self._default_filename(from_currency, to_currency, "feather")
+        
+        try:
+            self._columnar_frame(df, index).to_feather(filename)
+            print(f"Data saved successfully to {display_name or filename}")
+            return filename
+        except Exception as e:
+            print(f"Error saving to Feather: {e}")
+            return None
+    
+    def save_to_excel(self, df, filename=None, from_currency="USD", to_currency="INR", index=True, write_only=None,
+                      extra_sheets=None, display_name=None):
+        """
+        Save DataFrame to Excel file
+        
+        Pass index=False for tidy frames that carry no month index. Large
+        frames (or write_only=True) go through a write-only workbook that
+        streams rows instead of keeping every cell in memory. extra_sheets
+        maps sheet names to further frames written without an index.
+        display_name is the name reported instead of filename, for writes
+        into a temporary file.
+        """
+        if filename is None:
+            filename = self._default_filename(from_currency, to_currency, "xlsx")
+        
+        sheets = [('Exchange Rates', df, index)]
+        sheets += [(name, frame, False) for name, frame in (extra_sheets or {}).items()]
+        if write_only is None:
+            write_only = sum(frame.size for _, frame, _ in sheets) >= EXCEL_WRITE_ONLY_CELLS
+        
+        try:
+            if write_only:
+                self._write_excel_streaming(sheets, filename)
+            else:
+                # Create Excel writer with formatting
+                with pd.ExcelWriter(filename, engine='openpyxl') as writer:
+                    header_font, header_fill, center, bold = excel_styles()
+                    for sheet_name, frame, frame_index in sheets:
+                        if frame_index:
+                            frame.to_excel(writer, sheet_name=sheet_name, index_label='Month')
+                        else:
+                            frame.to_excel(writer, sheet_name=sheet_name, index=False)
+                        
+                        worksheet = writer.sheets[sheet_name]
+                        
+                        # Format header row
+                        for cell in worksheet[1]:
+                            cell.font = header_font
+                            cell.fill = header_fill
+                            cell.alignment = center
+                        
+                        # Format month column
+                        if frame_index:
+                            for row in worksheet.iter_rows(min_row=2, max_col=1):
+                                row[0].font = bold
+                                row[0].alignment = center
+                        
+                        # Column widths come from the DataFrame, not from the cells
+                        for column_letter, width in excel_column_widths(frame, frame_index).items():
+                            worksheet.column_dimensions[column_letter].width = width
+            
+            print(f"Data saved successfully to {display_name or filename}")
+            return filename
+            
+        except Exception as e:
+            print(f"Error saving to Excel: {e}")
+            return None
+    
+    def _write_excel_streaming(self, sheets, filename):
+        """
+        Write (sheet name, frame, index) sheets through an openpyxl
+        write-only workbook; only the header and month cells carry styles,
+        data rows are appended as plain values
+        """
+        from openpyxl import Workbook
+        from openpyxl.cell import WriteOnlyCell
+        
+        workbook = Workbook(write_only=True)
+        header_font, header_fill, center, bold = excel_styles()
+        
+        for sheet_name, df, index in sheets:
+            worksheet = workbook.create_sheet(sheet_name)
+            
+            # Widths must be set before the first row is written
+            for column_letter, width in excel_column_widths(df, index).items():
+                worksheet.column_dimensions[column_letter].width = width
+            
+            header = (['Month'] if index else []) + [str(column) for column in df.columns]
+            header_cells = []
+            for value in header:
+                cell = WriteOnlyCell(worksheet, value=value)
+                cell.font = header_font
+                cell.fill = header_fill
+                cell.alignment = center
+                header_cells.append(cell)
+            worksheet.append(header_cells)
+            
+            # NaN becomes an empty cell, like DataFrame.to_excel does
+            values = df.astype(object).where(df.notna(), None)
+            for row in values.itertuples(index=index, name=None):
+                if index:
+                    month = WriteOnlyCell(worksheet, value=row[0])
+                    month.font = bold
+                    month.alignment = center
+                    row = (month,) + row[1:]
+                worksheet.append(row)
+        
+        workbook.save(filename)
+    
+class DailyScheduler:
+    """
+    Persistent, resumable job queue for daily historical rate pages
+    
+    One job is one historical page, i.e. one (from_currency, date); that
+    page carries the rates against every other currency, so all pairs that
+    share a source currency cost a single request per day. Jobs and parsed
+    rates live in SQLite, so an interrupted run picks up where it stopped.
+    Fetches reuse the scraper's session, rate limiter and retry policy, with
+    at most `workers` pages in flight.
+    """
+    def __init__(self, scraper, path="daily_jobs.sqlite"):
+        self.scraper = scraper
+        self.path = path
+        self.historical_url = urljoin(scraper.base_url, '../historical/')
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                from_currency TEXT NOT NULL,
+                date TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (from_currency, date)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS daily_rates (
+                from_currency TEXT NOT NULL,
+                to_currency TEXT NOT NULL,
+                date TEXT NOT NULL,
+                rate REAL NOT NULL,
+                PRIMARY KEY (from_currency, to_currency, date)
+            ) WITHOUT ROWID;
+        """)
+        self.conn.commit()
+    
+    def close(self):
+        """
+        Close the SQLite connection
+        """
+        self.conn.close()
+    
+    def enqueue(self, from_currencies, start_date, end_date):
+        """
+        Add one job per source currency and day; existing jobs are kept
+        """
+        days = (end_date - start_date).days + 1
+        rows = [(from_currency, (start_date + timedelta(days=i)).isoformat())
+                for from_currency in from_currencies for i in range(days)]
+        with self.conn:
+            before = self.conn.total_changes
+            self.conn.executemany("INSERT OR IGNORE INTO jobs (from_currency, date) VALUES (?, ?)", rows)
+            return self.conn.total_changes - before
+    
+    def counts(self):
+        """
+        Number of jobs per status
+        """
+        return dict(self.conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+    
+    def fetch_day(self, from_currency, day):
+        """
+        Fetch and parse one historical page; returns {to_currency: rate} or None
+        """
+        url = f"{self.historical_url}?from={from_currency}&amount=1&date={day}"
+        metrics = self.scraper.metrics
+        with metrics.context(source=from_currency, date=day), metrics.span("fetch"):
+            if self.scraper.replay_archive:
+                recorded = self.scraper.replay_archive.get(url)
+                if recorded is None:
+                    raise LookupError(f"{url} is not in the replay archive")
+                content = recorded[0]
+            else:
+                response = self.scraper.retry_policy.get(self.scraper.session, url, self.scraper.rate_limiter,
+                                                         timeout=10, stream=True)
+                response.raise_for_status()
+                started = time.perf_counter()
+                content = response.content
+                metrics.record("download", time.perf_counter() - started, bytes=len(content))
+                if self.scraper.record_archive:
+                    self.scraper.record_archive.put(url, content, response.status_code, response.headers)
+            with metrics.span("parse"):
+                return parse_historical_rates(content, from_currency)
+    
+    def _flush(self, finished):
+        """
+        Record finished jobs and their rates in one transaction
+        """
+        rates = []
+        statuses = []
+        for (from_currency, day), day_rates in finished:
+            status = 'done' if day_rates else 'failed'
+            statuses.append((status, from_currency, day))
+            for to_currency, rate in (day_rates or {}).items():
+                rates.append((from_currency, to_currency, day, rate))
+        with self.conn:
+            self.conn.executemany(
+                "UPDATE jobs SET status = ?, attempts = attempts + 1 WHERE from_currency = ? AND date = ?",
+                statuses)
+            self.conn.executemany("INSERT OR REPLACE INTO daily_rates VALUES (?, ?, ?, ?)", rates)
+        finished.clear()
+    
+    def run(self, workers=4, max_attempts=3, batch_size=200):
+        """
+        Work through every unfinished job with at most `workers` in flight
+        
+        Progress is committed every batch_size jobs, and again on exit. On
+        Ctrl+C the queued jobs are cancelled, the pages already being
+        fetched are waited for, and everything that finished is recorded.
+        """
+        if self.scraper.rate_limiter is None or self.scraper.pauses:
+            self.scraper.rate_limiter = RateLimiter()
+            self.scraper.pauses = False
+        
+        jobs = self.conn.execute(
+            "SELECT from_currency, date FROM jobs WHERE status != 'done' AND attempts < ? "
+            "ORDER BY date, from_currency", (max_attempts,)).fetchall()
+        total = len(jobs)
+        print(f"{total} daily pages to fetch with {workers} workers")
+        
+        def fetch(job):
+            try:
+                return self.fetch_day(*job)
+            except Exception as e:
+                print(f"Error fetching {job[0]} {job[1]}: {e}")
+                return None
+        
+        finished = []
+        done = 0
+        pending_jobs = iter(jobs)
+        in_flight = {}
+        pool = ThreadPoolExecutor(max_workers=workers)
+        try:
+            while True:
+                # Keep the pool busy without materialising a future per job
+                while len(in_flight) < workers * 2:
+                    job = next(pending_jobs, None)
+                    if job is None:
+                        break
+                    in_flight[pool.submit(fetch, job)] = job
+                if not in_flight:
+                    break
+                completed, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in completed:
+                    finished.append((in_flight.pop(future), future.result()))
+                    done += 1
+                if len(finished) >= batch_size:
+                    self._flush(finished)
+                    print(f"Progress: {done}/{total} pages")
+        finally:
+            # Drop queued work, let running fetches end and record every finished one
+            pool.shutdown(wait=True, cancel_futures=True)
+            finished.extend((job, future.result()) for future, job in in_flight.items()
+                            if future.done() and not future.cancelled())
+            self._flush(finished)
+        
+        return self.counts()
+    
+    def frame(self, pairs, start_date, end_date):
+        """
+        Stored daily rates for the given pairs as a tidy DataFrame
+        """
+        frames = []
+        for from_currency, to_currency in pairs:
+            rows = self.conn.execute(
+                "SELECT date, rate FROM daily_rates WHERE from_currency = ? AND to_currency = ? "
+                "AND date BETWEEN ? AND ? ORDER BY date",
+                (from_currency, to_currency, start_date.isoformat(), end_date.isoformat())).fetchall()
+            frame = pd.DataFrame(rows, columns=['date', 'rate'])
+            frame.insert(0, 'pair', f"{from_currency}/{to_currency}")
+            frame.insert(1, 'from_currency', from_currency)
+            frame.insert(2, 'to_currency', to_currency)
+            frames.append(frame)
+        
+        df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(
+            columns=['pair', 'from_currency', 'to_currency', 'date', 'rate'])
+        df['date'] = pd.to_datetime(df['date'])
+        return df.astype({'pair': 'category', 'from_currency': 'category', 'to_currency': 'category'})
+
+class AsyncRateLimiter:
+    """
+    asyncio flavour of RateLimiter for use inside one event loop
+    """
+    def __init__(self, rate=1.0, burst=1):
+        self.rate = float(rate)
+        self.capacity = max(1, int(burst))
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+    
+    async def acquire(self):
+        """
+        Wait until a request token is available
+        """
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+class AsyncXRatesScraper:
+    """
+    Async twin of XRatesScraper backed by one pooled keep-alive httpx client
+    
+    Use it as an async context manager so the connection pool is closed:
+    
+        async with AsyncXRatesScraper() as scraper:
+            df = await scraper.scrape_multiple_years(2015)
+    """
+    def __init__(self, base_url="https://www.x-rates.com/average/", rate_limiter=None,
+                 max_connections=10, concurrency=10):
+        if not module_available('httpx'):
+            raise ImportError("AsyncXRatesScraper needs httpx (pip install httpx)")
         self.base_url = base_url
-        self.session = requests.Session()
-        # Add headers to avoid being blocked
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.5',
-            'Accept-Encoding': 'gzip, deflate',
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1',
-        })
+        self.rate_limiter = rate_limiter or AsyncRateLimiter()
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.year_timings = {}
+        limits = httpx.Limits(max_connections=max_connections,
+                              max_keepalive_connections=max_connections)
+        self.client = httpx.AsyncClient(headers=DEFAULT_HEADERS, limits=limits, timeout=10)
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+    
+    async def aclose(self):
+        """
+        Close the pooled HTTP client
+        """
+        await self.client.aclose()
     
-    def get_year_data(self, year, from_currency="USD", to_currency="INR", amount=1):
+    async def get_year_data(self, year, from_currency="USD", to_currency="INR", amount=1):
         """
         Fetch exchange rate data for a specific year
         """
         url = f"{self.base_url}?from={from_currency}&to={to_currency}&amount={amount}&year={year}"
         
         try:
-            print(f"Fetching data for year {year}...")
-            response = self.session.get(url, timeout=10)
-            response.raise_for_status()
+            async with self.semaphore:
+                await self.rate_limiter.acquire()
+                response = await self.client.get(url)
+                response.raise_for_status()
             
-            # Wait a bit to be respectful to the server
-            time.sleep(1)
-            
-            soup = BeautifulSoup(response.content, 'html.parser')
+            year_data = parse_average_rates(response.content)
             
-            # Find the OutputLinksAvg class
-            output_links = soup.find('ul', class_='OutputLinksAvg')
-            
-            if not output_links:
-                print(f"Warning: Could not find OutputLinksAvg class for year {year}")
+            if year_data is None:
+                print(f"Warning: Could not find OutputLinksAvg class for {from_currency}/{to_currency} {year}")
                 return None
             
-            # Wait a bit more to ensure all content is loaded
-            time.sleep(0.5)
-            
-            year_data = {}
-            
-            # Parse each month's data
-            for li in output_links.find_all('li'):
-                month_span = li.find('span', class_='avgMonth')
-                rate_span = li.find('span', class_='avgRate')
-                
-                if month_span and rate_span:
-                    month = month_span.text.strip()
-                    rate_text = rate_span.text.strip()
-                    
-                    # Extract numeric value from rate
-                    rate_match = re.search(r'[\d.]+', rate_text)
-                    if rate_match:
-                        rate = float(rate_match.group())
-                        year_data[month] = rate
-            
-            print(f"Successfully fetched {len(year_data)} months for year {year}")
             return year_data
             
-        except requests.exceptions.RequestException as e:
-            print(f"Error fetching data for year {year}: {e}")
+        except httpx.HTTPError as e:
+            print(f"Error fetching data for {from_currency}/{to_currency} {year}: {e}")
             return None
         except Exception as e:
-            print(f"Error parsing data for year {year}: {e}")
+            print(f"Error parsing data for {from_currency}/{to_currency} {year}: {e}")
             return None
     
-    def scrape_multiple_years(self, start_year, end_year=None, from_currency="USD", to_currency="INR"):
+    async def _timed_year(self, year, from_currency, to_currency):
+        """
+        Fetch one year and return (year, data, elapsed seconds)
+        """
+        started = time.perf_counter()
+        year_data = await self.get_year_data(year, from_currency, to_currency)
+        return year, year_data, time.perf_counter() - started
+    
+    async def fetch_many(self, jobs):
+        """
+        Fetch many (from_currency, to_currency, year) jobs on this event loop
+        
+        Returns a dict keyed by the job tuple.
+        """
+        jobs = list(jobs)
+        results = await asyncio.gather(*(self.get_year_data(year, from_currency, to_currency)
+                                         for from_currency, to_currency, year in jobs))
+        return dict(zip(jobs, results))
+    
+    async def scrape_multiple_years(self, start_year, end_year=None, from_currency="USD", to_currency="INR"):
         """
         Scrape data for multiple years and return as DataFrame
         """
         if end_year is None:
             end_year = datetime.now().year
         
-        all_data = {}
+        fetched = await asyncio.gather(*(self._timed_year(year, from_currency, to_currency)
+                                         for year in range(start_year, end_year + 1)))
+        self.year_timings = {year: elapsed for year, _, elapsed in fetched}
         
-        for year in range(start_year, end_year + 1):
-            year_data = self.get_year_data(year, from_currency, to_currency)
+        return build_rates_frame({year: year_data for year, year_data, _ in fetched})
+
+class LRUCache:
+    """
+    Thread-safe least recently used cache of parsed year pages
+    """
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def __len__(self):
+        return len(self.items)
+    
+    def get(self, key):
+        """
+        Return the cached value for key and mark it recently used, or None
+        """
+        with self.lock:
+            if key not in self.items:
+                self.misses += 1
+                return None
+            self.items.move_to_end(key)
+            self.hits += 1
+            return self.items[key]
+    
+    def put(self, key, value):
+        """
+        Store value under key, evicting the least recently used entry when full
+        """
+        with self.lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            while len(self.items) > self.maxsize:
+                self.items.popitem(last=False)
+    
+    def keys(self):
+        """
+        Snapshot of the cached keys, least recently used first
+        """
+        with self.lock:
+            return list(self.items)
+
+class RateAnalytics:
+    """
+    Month-over-month and year-over-year change, rolling averages,
+    volatility and annual means for every pair of a tidy monthly frame
+    
+    All rates are scattered into one (pair x month) grid, so each figure
+    is a shifted or windowed array operation over all pairs at once rather
+    than a groupby per pair. Figures are computed on first access, and
+    for_frame hands back the same instance for a frame with the same rates
+    and windows, keyed by a hash of the dataset.
+    """
+    _memo = LRUCache(8)
+    
+    def __init__(self, tidy, window=3, volatility_window=12):
+        self.tidy = tidy
+        self.window = window
+        self.volatility_window = volatility_window
+        self._grid = None
+        self._annual_grid = None
+        self._monthly = None
+        self._annual = None
+    
+    @staticmethod
+    def dataset_hash(tidy):
+        """
+        SHA-256 over the pair, year, month and rate columns of a tidy frame
+        """
+        digest = hashlib.sha256(json.dumps([str(pair) for pair in tidy['pair'].cat.categories]).encode())
+        digest.update(tidy['pair'].cat.codes.to_numpy().astype(np.int32).tobytes())
+        digest.update(tidy['year'].to_numpy().astype(np.int16).tobytes())
+        digest.update(tidy['month'].cat.codes.to_numpy().astype(np.int8).tobytes())
+        digest.update(tidy['rate'].to_numpy(dtype=np.float64).tobytes())
+        return digest.hexdigest()
+    
+    @classmethod
+    def for_frame(cls, df, pair=None, window=3, volatility_window=12):
+        """
+        Memoized analytics for a tidy frame, or for the month x year frame
+        of one "FROM/TO" pair
+        """
+        if 'pair' not in df.columns:
+            from_currency, to_currency = pair.split('/')
+            df = tidy_from_matrix(df, from_currency, to_currency)
+        key = (cls.dataset_hash(df), window, volatility_window)
+        analytics = cls._memo.get(key)
+        if analytics is None:
+            analytics = cls(df, window, volatility_window)
+            cls._memo.put(key, analytics)
+        return analytics
+    
+    @property
+    def settings(self):
+        """
+        Short description of the windows, recorded in output manifests
+        """
+        return f"analytics:{self.window}m,{self.volatility_window}m"
+    
+    @property
+    def grid(self):
+        """
+        (rates, log changes, first year, pair codes, periods): rates is
+        pairs x months from January of the first year with NaN gaps, log
+        changes holds log(rate / previous month's rate) at the later month
+        """
+        if self._grid is None:
+            tidy = self.tidy
+            codes = tidy['pair'].cat.codes.to_numpy().astype(np.int64)
+            years = tidy['year'].to_numpy().astype(np.int64)
+            first_year = int(years.min()) if len(years) else 0
+            periods = (years - first_year) * 12 + tidy['month'].cat.codes.to_numpy()
+            span = int(years.max()) - first_year + 1 if len(years) else 0
             
-            if year_data:
-                # Add year data to the main dictionary
-                for month, rate in year_data.items():
-                    if month not in all_data:
-                        all_data[month] = {}
-                    all_data[month][year] = rate
+            rates = np.full((len(tidy['pair'].cat.categories), span * 12), np.nan)
+            rates[codes, periods] = tidy['rate'].to_numpy(dtype=np.float64)
+            changes = np.full(rates.shape, np.nan)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                changes[:, 1:] = np.log(rates[:, 1:] / rates[:, :-1])
+            self._grid = (rates, changes, first_year, codes, periods)
+        return self._grid
+    
+    @staticmethod
+    def _trailing_sums(values, window):
+        """
+        Sum of the trailing window ending at each month, NaN unless every
+        month in it has a value
+        """
+        sums = np.full(values.shape, np.nan)
+        width = values.shape[1] - window + 1
+        if width > 0:
+            sums[:, window - 1:] = values[:, :width]
+            for offset in range(1, window):
+                sums[:, window - 1:] += values[:, offset:offset + width]
+        return sums
+    
+    @staticmethod
+    def _shifted(values, months):
+        """
+        values moved right by months along the month axis, NaN filled
+        """
+        shifted = np.full(values.shape, np.nan)
+        shifted[:, months:] = values[:, :values.shape[1] - months]
+        return shifted
+    
+    def _rows(self, values):
+        """
+        values[pair, month] for every row of the tidy frame
+        """
+        _, _, _, codes, periods = self.grid
+        return np.take(values, codes * values.shape[1] + periods)
+    
+    @property
+    def monthly(self):
+        """
+        The tidy frame plus mom_pct, yoy_pct, rolling_mean_<window>m,
+        volatility_<window>m_pct (annualised standard deviation of monthly
+        log changes over the trailing window, in percent) and annual_mean
+        """
+        if self._monthly is None:
+            rates, changes, _, codes, periods = self.grid
+            current = self.tidy['rate'].to_numpy(dtype=np.float64)
+            n = self.volatility_window
             
-            # Be respectful to the server
-            time.sleep(2)
-        
-        # Convert to DataFrame
-        df = pd.DataFrame(all_data).T
-        
-        # Reorder months properly
-        month_order = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 
-                      'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+            with np.errstate(divide='ignore', invalid='ignore'):
+                mom = (current / self._rows(self._shifted(rates, 1)) - 1) * 100
+                yoy = (current / self._rows(self._shifted(rates, 12)) - 1) * 100
+                rolling = self._rows(self._trailing_sums(rates, self.window)) / self.window
+                
+                total = self._trailing_sums(changes, n)
+                squares = self._trailing_sums(changes * changes, n)
+                variance = np.maximum((squares - total * total / n) / (n - 1), 0)
+                volatility = self._rows(np.sqrt(variance * 12) * 100)
+            
+            mean = self.annual_grid[0]
+            annual_mean = np.take(mean, codes * mean.shape[1] + periods // 12)
+            self._monthly = self.tidy.assign(**{
+                'mom_pct': mom,
+                'yoy_pct': yoy,
+                f'rolling_mean_{self.window}m': rolling,
+                f'volatility_{self.volatility_window}m_pct': volatility,
+                'annual_mean': annual_mean,
+            })
+        return self._monthly
+    
+    @property
+    def annual_grid(self):
+        """
+        (mean, months, min, max, volatility) as pairs x years arrays;
+        volatility uses the February to December changes, leaving out
+        January's change from the previous December
+        """
+        if self._annual_grid is not None:
+            return self._annual_grid
+        rates, changes, _, _, _ = self.grid
+        by_year = rates.reshape(len(rates), -1, 12)
+        present = ~np.isnan(by_year)
+        months = present.sum(axis=2)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean = np.where(present, by_year, 0).sum(axis=2) / months
+            
+            # Only the 11 changes within the year
+            changes = changes.reshape(len(changes), -1, 12)[:, :, 1:]
+            counted = ~np.isnan(changes)
+            n = counted.sum(axis=2)
+            total = np.where(counted, changes, 0).sum(axis=2)
+            squares = np.where(counted, changes * changes, 0).sum(axis=2)
+            variance = np.maximum((squares - total * total / n) / (n - 1), 0)
+            volatility = np.where(n > 1, np.sqrt(variance * 12) * 100, np.nan)
+        self._annual_grid = (mean, months, np.fmin.reduce(by_year, axis=2), np.fmax.reduce(by_year, axis=2), volatility)
+        return self._annual_grid
+    
+    @property
+    def annual(self):
+        """
+        One row per pair and year: months with a rate, mean, min, max, the
+        change of the mean from the previous year and the annualised
+        volatility of the monthly log changes within the year, in percent
+        """
+        if self._annual is None:
+            _, _, first_year, _, _ = self.grid
+            mean, months, low, high, volatility = self.annual_grid
+            with np.errstate(divide='ignore', invalid='ignore'):
+                change = np.full(mean.shape, np.nan)
+                change[:, 1:] = (mean[:, 1:] / mean[:, :-1] - 1) * 100
+            
+            pair_codes, year_index = np.nonzero(months)
+            pairs = self.tidy['pair'].cat.categories
+            from_currency, to_currency = zip(*(str(pair).split('/') for pair in pairs)) if len(pairs) else ((), ())
+            currency = lambda names: pd.Categorical(np.asarray(names, dtype=object)[pair_codes])
+            self._annual = pd.DataFrame({
+                'pair': pd.Categorical.from_codes(pair_codes, pairs),
+                'from_currency': currency(from_currency),
+                'to_currency': currency(to_currency),
+                'year': (year_index + first_year).astype(np.int16),
+                'months': months[pair_codes, year_index].astype(np.int8),
+                'mean': mean[pair_codes, year_index],
+                'min': low[pair_codes, year_index],
+                'max': high[pair_codes, year_index],
+                'mean_change_pct': change[pair_codes, year_index],
+                'volatility_pct': volatility[pair_codes, year_index],
+            })
+        return self._annual
+    
+    def sheets(self):
+        """
+        {sheet name: frame} for the extra sheets of an Excel export
+        """
+        return {'Analytics': self.monthly, 'Annual Means': self.annual}
+
+class RateService:
+    """
+    Rate lookups for the serve mode
+    
+    Year pages are answered from an in-memory LRU cache. Concurrent misses
+    for the same (from_currency, to_currency, year) share one fetch through
+    the scraper. A background thread revalidates the cached current-year
+    pages every refresh_interval seconds. Failed lookups are remembered
+    for failure_ttl seconds, so repeats of a bad query do not go back to
+    the site with full retries each time.
+    """
+    def __init__(self, scraper, cache_size=1024, refresh_interval=3600, failure_ttl=60):
+        self.scraper = scraper
+        self.cache = LRUCache(cache_size)
+        # key -> time.monotonic() until which the lookup is answered as failed
+        self.failures = LRUCache(cache_size)
+        self.failure_ttl = failure_ttl
+        self.failed_hits = 0
+        self.refresh_interval = refresh_interval
+        self.inflight = {}
+        self.inflight_lock = threading.Lock()
+        self.fetches = 0
+        self.shared_fetches = 0
+        self.last_refresh = None
+        self.stopped = threading.Event()
+        self.refresher = threading.Thread(target=self._refresh_loop, name="rate-refresh", daemon=True)
+    
+    def start(self):
+        """
+        Start the background refresh thread
+        """
+        if self.refresh_interval:
+            self.refresher.start()
+    
+    def stop(self):
+        """
+        Ask the background refresh thread to finish
+        """
+        self.stopped.set()
+        if self.refresher.is_alive():
+            self.refresher.join(timeout=5)
+    
+    def year_data(self, from_currency, to_currency, year, refresh=False):
+        """
+        Monthly rates for one pair and year, or None if they could not be fetched
+        """
+        key = (from_currency, to_currency, year)
+        if not refresh:
+            year_data = self.cache.get(key)
+            if year_data is not None:
+                return year_data
+            failed_until = self.failures.get(key)
+            if failed_until is not None and time.monotonic() < failed_until:
+                with self.inflight_lock:
+                    self.failed_hits += 1
+                return None
         
-        # Only include months that exist in the data
-        existing_months = [month for month in month_order if month in df.index]
-        df = df.reindex(existing_months)
+        with self.inflight_lock:
+            future = self.inflight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self.inflight[key] = future
+                self.fetches += 1
+            else:
+                self.shared_fetches += 1
         
-        # Sort columns (years) in ascending order
-        df = df.sort_index(axis=1)
+        if not owner:
+            return future.result()
         
-        return df
+        try:
+            year_data = self.scraper.get_year_data(year, from_currency, to_currency, refresh=refresh)
+            if year_data:
+                self.cache.put(key, year_data)
+            else:
+                self.failures.put(key, time.monotonic() + self.failure_ttl)
+            future.set_result(year_data)
+            return year_data
+        except Exception as e:
+            self.failures.put(key, time.monotonic() + self.failure_ttl)
+            future.set_exception(e)
+            raise
+        finally:
+            with self.inflight_lock:
+                del self.inflight[key]
     
-    def save_to_excel(self, df, filename=None, from_currency="USD", to_currency="INR"):
+    def refresh(self):
         """
-        Save DataFrame to Excel file
+        Revalidate every cached page of the current year; returns how many were refreshed
         """
-        if filename is None:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"exchange_rates_{from_currency}_to_{to_currency}_{timestamp}.xlsx"
-        
+        current_year = datetime.now().year
+        refreshed = 0
+        for from_currency, to_currency, year in self.cache.keys():
+            if year == current_year and self.year_data(from_currency, to_currency, year, refresh=True):
+                refreshed += 1
+        self.last_refresh = time.time()
+        return refreshed
+    
+    def _refresh_loop(self):
+        while not self.stopped.wait(self.refresh_interval):
+            try:
+                refreshed = self.refresh()
+                print(f"Refreshed {refreshed} current-year pages")
+            except Exception as e:
+                print(f"Background refresh failed: {e}")
+    
+    def stats(self):
+        """
+        Cache and fetch counters for the /health endpoint
+        """
+        return {
+            "cached_pages": len(self.cache),
+            "cache_size": self.cache.maxsize,
+            "hits": self.cache.hits,
+            "misses": self.cache.misses,
+            "fetches": self.fetches,
+            "shared_fetches": self.shared_fetches,
+            "failed_hits": self.failed_hits,
+            "last_refresh": self.last_refresh,
+        }
+
+CURRENCY_CODE_RE = re.compile(r'\A[A-Z]{3}\Z')
+# First year the serve mode answers for
+MIN_YEAR = 1990
+
+class RateRequestHandler(BaseHTTPRequestHandler):
+    """
+    JSON API over a RateService
+    
+        GET /rates?from=USD&to=INR&year=2024[&month=Jan]
+        GET /health
+    
+    year defaults to the current year. Currencies must be three letter
+    codes and years between MIN_YEAR and the current year; anything else
+    gets a 400 before it reaches the upstream URL. The service is attached
+    to the server as server.service.
+    """
+    protocol_version = "HTTP/1.1"
+    
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/health":
+            self._send(200, self.server.service.stats())
+        elif url.path in ("/rates", "/rates/"):
+            self._rates(parse_qs(url.query))
+        else:
+            self._send(404, {"error": f"unknown path {url.path}"})
+    
+    def _rates(self, query):
+        from_currency = query.get("from", ["USD"])[0].upper()
+        to_currency = query.get("to", ["INR"])[0].upper()
+        month = query.get("month", [None])[0]
+        for currency in (from_currency, to_currency):
+            if not CURRENCY_CODE_RE.match(currency):
+                self._send(400, {"error": "currencies must be three letter codes"})
+                return
+        current_year = datetime.now().year
         try:
-            # Create Excel writer with formatting
-            with pd.ExcelWriter(filename, engine='openpyxl') as writer:
-                # Write the main data
-                df.to_excel(writer, sheet_name='Exchange Rates', index_label='Month')
-                
-                # Get the workbook and worksheet
-                workbook = writer.book
-                worksheet = writer.sheets['Exchange Rates']
-                
-                # Add some basic formatting
-                from openpyxl.styles import Font, PatternFill, Alignment
-                
-                # Header formatting
-                header_font = Font(bold=True, color="FFFFFF")
-                header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-                
-                # Format header row
-                for cell in worksheet[1]:
-                    cell.font = header_font
-                    cell.fill = header_fill
-                    cell.alignment = Alignment(horizontal="center")
-                
-                # Format month column
-                for row in range(2, len(df) + 2):
-                    cell = worksheet[f'A{row}']
-                    cell.font = Font(bold=True)
-                    cell.alignment = Alignment(horizontal="center")
-                
-                # Auto-adjust column widths
-                for column in worksheet.columns:
-                    max_length = 0
-                    column_letter = column[0].column_letter
-                    for cell in column:
-                        try:
-                            if len(str(cell.value)) > max_length:
-                                max_length = len(str(cell.value))
-                        except:
-                            pass
-                    adjusted_width = min(max_length + 2, 15)
-                    worksheet.column_dimensions[column_letter].width = adjusted_width
-            
-            print(f"Data saved successfully to {filename}")
-            return filename
-            
-        except Exception as e:
-            print(f"Error saving to Excel: {e}")
-            return None
+            year = int(query.get("year", [current_year])[0])
+        except ValueError:
+            self._send(400, {"error": "year must be an integer"})
+            return
+        if not MIN_YEAR <= year <= current_year:
+            self._send(400, {"error": f"year must be between {MIN_YEAR} and {current_year}"})
+            return
+        if month is not None:
+            month = month[:3].title()
+            if month not in MONTH_ORDER:
+                self._send(400, {"error": f"unknown month {month}"})
+                return
+        
+        year_data = self.server.service.year_data(from_currency, to_currency, year)
+        if not year_data:
+            self._send(502, {"error": f"no rates for {from_currency}/{to_currency} {year}"})
+            return
+        
+        body = {"from": from_currency, "to": to_currency, "year": year}
+        if month is None:
+            body["rates"] = year_data
+        elif month in year_data:
+            body.update(month=month, rate=year_data[month])
+        else:
+            self._send(404, {"error": f"no rate for {month} {year}"})
+            return
+        self._send(200, body)
+    
+    def _send(self, status, body):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+    
+    def log_message(self, *args):
+        pass
 
-def main():
-    parser = argparse.ArgumentParser(description='Scrape exchange rates from x-rates.com')
-    parser.add_argument('--start-year', type=int, default=2015, 
-                       help='Start year for data collection (default: 2015)')
-    parser.add_argument('--end-year', type=int, default=None,
-                       help='End year for data collection (default: current year)')
-    parser.add_argument('--from-currency', default='USD',
-                       help='Source currency (default: USD)')
-    parser.add_argument('--to-currency', default='INR',
-                       help='Target currency (default: INR)')
-    parser.add_argument('--output', default=None,
-                       help='Output filename (default: auto-generated)')
-    parser.add_argument('--current-year-only', action='store_true',
-                       help='Fetch only current year data')
+def print_request_stats(scraper):
+    """
+    One line with the retry counters, plus the adapted rate if a limiter is in use
+    """
+    counters = scraper.retry_policy.counters
+    line = (f"Requests: {counters['requests']}, retries: {counters['retries']}, "
+            f"throttled: {counters['throttled']}, failures: {counters['failures']}")
+    if scraper.rate_limiter:
+        line += f", final rate: {scraper.rate_limiter.rate:.2f} req/s"
+    print(line)
+    if scraper.transport == "httpx":
+        versions = ", ".join(f"{count} over {version}" for version, count in sorted(scraper.session.http_versions.items()))
+        print(f"httpx transport: {versions or 'no responses'}, {scraper.bytes_read / 1024:.1f} KiB received")
+    if scraper.record_archive:
+        print(f"Recorded {scraper.record_archive.recorded} pages to {scraper.record_archive.path}")
+    if scraper.replay_archive:
+        print(f"Replayed {scraper.replay_archive.replayed} pages from {scraper.replay_archive.path}")
+
+def output_options(args, df=None, pair=None):
+    """
+    save_output options taken from the command line; pass the monthly
+    frame (and its "FROM/TO" pair for a month x year frame) for --analytics
+    """
+    options = {'if_changed': args.if_changed}
+    if args.format == 'xlsx' and args.excel_write_only:
+        options['write_only'] = True
+    if args.analytics and df is not None:
+        options['analytics'] = RateAnalytics.for_frame(df, pair, args.analytics_window, args.volatility_window)
+    return options
+
+def print_saved(scraper, filename, args):
+    """
+    Final line of a run: where the data went, or why it did not
+    """
+    if not filename:
+        print(f"\n✗ Failed to save data as {args.format}")
+    elif scraper.last_write and not scraper.last_write['written']:
+        print(f"\n✓ Exchange rate data unchanged, nothing rewritten: {filename}")
+    else:
+        print(f"\n✓ Successfully saved exchange rate data to: {filename}")
+
+def scrape_pairs_main(scraper, pairs, args, store=None):
+    """
+    Multi-pair branch of main(): one shared scheduler, one tidy output file
+    """
+    end_year = args.end_year or datetime.now().year
+    start_year = end_year if args.current_year_only else args.start_year
+    print(f"Fetching {len(pairs)} pairs from {start_year} to {end_year}")
+    if store:
+        records = scraper.update_store(store, pairs, start_year, end_year, args.workers)
+    else:
+        records = scraper.scrape_pair_records(pairs, start_year, end_year, args.workers)
+    with scraper.metrics.span("assemble"):
+        df = records.to_frame()
     
-    args = parser.parse_args()
+    save_tidy_main(scraper, df, args, records)
+
+def cross_rates_main(scraper, currencies, args, store=None):
+    """
+    Cross-rate branch of main(): scrape against the anchor, derive the rest
+    """
+    end_year = args.end_year or datetime.now().year
+    start_year = end_year if args.current_year_only else args.start_year
+    anchor = args.anchor.upper()
+    print(f"Fetching {len(currencies)} currencies against {anchor} from {start_year} to {end_year}")
+    df = scraper.scrape_cross_rates(currencies, anchor, start_year, end_year, args.workers,
+                                    args.drift_sample, store)
     
-    # Initialize scraper
-    scraper = XRatesScraper()
+    drift = scraper.cross_drift
+    if drift:
+        print(f"\nDerived vs scraped over {drift['cells']} cells in {drift['pairs']} pairs: "
+              f"mean drift {drift['mean_pct']:.4f}%, max {drift['max_pct']:.4f}% ({drift['worst'][0]} {drift['worst'][1]} {drift['worst'][2]})")
+    elif args.drift_sample:
+        print("\nNo directly scraped cells to compare drift against")
+    
+    save_tidy_main(scraper, df, args)
+
+def daily_main(scraper, pairs, args):
+    """
+    Daily branch of main(): queue one page per source currency and day,
+    work the queue, then write the daily rates
+    """
+    end_year = args.end_year or datetime.now().year
+    start_year = end_year if args.current_year_only else args.start_year
+    start_date = date(start_year, 1, 1)
+    end_date = min(date(end_year, 12, 31), date.today())
+    
+    scheduler = DailyScheduler(scraper, args.daily_queue)
+    added = scheduler.enqueue(sorted({from_currency for from_currency, _ in pairs}), start_date, end_date)
+    print(f"Queued {added} new daily pages in {args.daily_queue} ({start_date} to {end_date})")
+    
+    try:
+        counts = scheduler.run(args.workers)
+    except KeyboardInterrupt:
+        print("\nInterrupted; progress is saved, run the same command again to resume")
+        scheduler.close()
+        return
+    print(f"Jobs by status: {counts}")
+    
+    df = scheduler.frame(pairs, start_date, end_date)
+    scheduler.close()
+    
+    if df.empty:
+        print_request_stats(scraper)
+        print("\n✗ No data was collected. Please check the website and try again.")
+        return
+    
+    print(f"\nData Summary:")
+    print(f"Rows: {len(df)}")
+    print(f"Pairs: {list(df['pair'].unique())}")
+    print(f"Days: {df['date'].min().date()} to {df['date'].max().date()}")
+    print_request_stats(scraper)
+    
+    print(f"\nPreview of data:")
+    print(df.head())
+    
+    filename = scraper.save_output(df, args.format, args.output, None, None, index=False, **output_options(args))
+    print_saved(scraper, filename, args)
+
+def save_tidy_main(scraper, df, args, records=None):
+    """
+    Summary, preview and output for a tidy multi-pair frame, built from
+    records when it came straight from scraping or the store
+    """
+    if df.empty:
+        print_request_stats(scraper)
+        print("\n✗ No data was collected. Please check the website and try again.")
+        return
+    
+    print(f"\nData Summary:")
+    print(f"Rows: {len(df)}")
+    print(f"Pairs: {list(df['pair'].unique())}")
+    print(f"Years: {sorted(df['year'].unique().tolist())}")
+    footprint = memory_footprint(df, records)
+    print(f"Memory: {format_bytes(footprint['typed_bytes'])} typed, vs {format_bytes(footprint['object_bytes'])} "
+          f"as object columns and ~{format_bytes(footprint['dict_bytes'])} as per-page dicts")
+    if records is not None:
+        print(f"RateRecords it was built from: {format_bytes(footprint['records_bytes'])}")
+    print_request_stats(scraper)
+    present = set(zip(df['from_currency'], df['to_currency'], df['year']))
+    missing = [job for job in scraper.job_timings if job not in present]
+    if missing:
+        print(f"Missing (pair, year) cells: {len(missing)}")
+    
+    print(f"\nPreview of data:")
+    print(df.head())
+    
+    filename = scraper.save_output(df, args.format, args.output, None, None, index=False,
+                                   **output_options(args, df))
+    print_saved(scraper, filename, args)
+
+def lite_main(scraper, args):
+    """
+    Single-pair CSV/JSON branch of main() that never imports pandas
+    """
+    end_year = args.end_year or datetime.now().year
+    start_year = end_year if args.current_year_only else args.start_year
+    print(f"Fetching data from {start_year} to {end_year}")
+    jobs = [(args.from_currency, args.to_currency, year) for year in range(start_year, end_year + 1)]
+    results, timings = scraper.run_jobs(jobs, args.workers)
+    results = {year: year_data for (_, _, year), year_data in results.items()}
+    
+    years, rows = rates_table(results)
+    if not years:
+        print_request_stats(scraper)
+        print("\n✗ No data was collected. Please check the website and try again.")
+        return
+    
+    print(f"\nData Summary:")
+    print(f"Shape: ({len(rows)}, {len(years)})")
+    print(f"Years: {years}")
+    print(f"Months: {[row[0] for row in rows]}")
+    print(f"Fetch time per year: " + ", ".join(f"{job[2]}: {secs:.2f}s" for job, secs in sorted(timings.items())))
+    print_request_stats(scraper)
+    
+    print(f"\nPreview of data:")
+    print("      " + "".join(f"{year:>12}" for year in years))
+    for row in rows[:5]:
+        print(f"{row[0]:<6}" + "".join(f"{'NaN' if rate is None else rate:>12}" for rate in row[1:]))
+    
+    filename = scraper.save_year_rates(results, args.format, args.output, args.from_currency, args.to_currency,
+                                       if_changed=args.if_changed)
+    print_saved(scraper, filename, args)
+
+def write_metrics(scraper, args):
+    """
+    Export the run's spans and counters where the command line asked for them
+    """
+    counters = scraper.metric_counters()
+    if args.metrics_jsonl:
+        print(f"Metrics written to {scraper.metrics.write_jsonl(args.metrics_jsonl, counters)}")
+    if args.metrics_prom:
+        print(f"Metrics written to {scraper.metrics.write_prometheus(args.metrics_prom, counters)}")
+
+def serve_main(scraper, args):
+    """
+    Serve mode: answer rate queries over HTTP until interrupted
+    """
+    if scraper.rate_limiter is None or scraper.pauses:
+        scraper.rate_limiter = RateLimiter()
+        scraper.pauses = False
+    service = RateService(scraper, args.lru_size, args.refresh_interval * 60)
+    server = ThreadingHTTPServer((args.host, args.port), RateRequestHandler)
+    server.daemon_threads = True
+    server.service = service
+    service.start()
+    
+    host, port = server.server_address[:2]
+    print(f"Serving rates on http://{host}:{port}/rates?from=USD&to=INR&year={datetime.now().year}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nShutting down")
+    finally:
+        service.stop()
+        server.server_close()
+    print(f"Service stats: {service.stats()}")
+
+def scrape_main(scraper, args):
+    """
+    Pick the scraping mode from the command line and run it
+    """
+    try:
+        pairs = load_pairs(args.pairs, args.pairs_file)
+    except (OSError, ValueError) as e:
+        print(f"✗ Could not read currency pairs: {e}")
+        sys.exit(1)
+    
+    store = RateStore(args.store) if args.update else None
+    
+    if args.daily:
+        if args.analytics:
+            print("--analytics works on monthly averages; ignored for --daily")
+        daily_main(scraper, pairs or [(args.from_currency.upper(), args.to_currency.upper())], args)
+        return
+    
+    if args.currencies:
+        currencies = list(dict.fromkeys(c.strip().upper() for c in args.currencies.split(',') if c.strip()))
+        cross_rates_main(scraper, currencies, args, store)
+        return
+    
+    if pairs:
+        scrape_pairs_main(scraper, pairs, args, store)
+        return
+    
+    if not store and args.format in LITE_FORMATS and not args.analytics:
+        lite_main(scraper, args)
+        return
     
-    if args.current_year_only:
+    if store:
+        end_year = args.end_year or datetime.now().year
+        start_year = end_year if args.current_year_only else args.start_year
+        print(f"Updating {args.store} from {start_year} to {end_year}")
+        records = scraper.update_store(store, [(args.from_currency, args.to_currency)], start_year, end_year, args.workers)
+        df = rates_matrix(records.to_frame())
+    elif args.current_year_only:
         current_year = datetime.now().year
         print(f"Fetching data for current year only: {current_year}")
         df = scraper.scrape_multiple_years(current_year, current_year, 
-                                         args.from_currency, args.to_currency)
+                                         args.from_currency, args.to_currency, args.workers)
     else:
         end_year = args.end_year or datetime.now().year
         print(f"Fetching data from {args.start_year} to {end_year}")
         df = scraper.scrape_multiple_years(args.start_year, end_year, 
-                                         args.from_currency, args.to_currency)
+                                         args.from_currency, args.to_currency, args.workers)
     
     if df is not None and not df.empty:
         print(f"\nData Summary:")
         print(f"Shape: {df.shape}")
         print(f"Years: {list(df.columns)}")
         print(f"Months: {list(df.index)}")
+        if scraper.year_timings:
+            timings = ", ".join(f"{year}: {secs:.2f}s" for year, secs in sorted(scraper.year_timings.items()))
+            print(f"Fetch time per year: {timings}")
+        print_request_stats(scraper)
+        if args.stream:
+            if not scraper.unsized_stops:
+                skipped = f"{scraper.bytes_saved / 1024:.1f} KiB"
+            elif scraper.bytes_saved:
+                skipped = (f"at least {scraper.bytes_saved / 1024:.1f} KiB "
+                           f"({scraper.unsized_stops} pages had no Content-Length)")
+            else:
+                skipped = "an unknown amount (no Content-Length)"
+            print(f"Downloaded {scraper.bytes_read / 1024:.1f} KiB, "
+                  f"skipped {skipped} by stopping after the rate list")
         
         # Display preview
         print(f"\nPreview of data:")
         print(df.head())
         
-        # Save to Excel
-        filename = scraper.save_to_excel(df, args.output, args.from_currency, args.to_currency)
-        
-        if filename:
-            print(f"\n✓ Successfully saved exchange rate data to: {filename}")
-        else:
-            print("\n✗ Failed to save data to Excel")
+        # Save in the requested format
+        filename = scraper.save_output(df, args.format, args.output, args.from_currency, args.to_currency,
+                                       **output_options(args, df, f"{args.from_currency}/{args.to_currency}"))
+        print_saved(scraper, filename, args)
     else:
+        print_request_stats(scraper)
         print("\n✗ No data was collected. Please check the website and try again.")
 
+def main():
+    parser = argparse.ArgumentParser(description='Scrape exchange rates from x-rates.com')
+    parser.add_argument('command', nargs='?', default='scrape', choices=['scrape', 'serve'],
+                       help='scrape once and write a file, or serve rates over HTTP (default: scrape)')
+    parser.add_argument('--base-url', default='https://www.x-rates.com/average/',
+                       help='Average rates page to scrape, e.g. a local fixture server (default: x-rates.com)')
+    parser.add_argument('--start-year', type=int, default=2015, 
+                       help='Start year for data collection (default: 2015)')
+    parser.add_argument('--end-year', type=int, default=None,
+                       help='End year for data collection (default: current year)')
+    parser.add_argument('--bulk-file', default=None,
+                       help='Compute monthly averages from one bulk daily history file (CSV, XML or ZIP; URL or path) instead of x-rates pages')
+    parser.add_argument('--bulk-base', default='EUR',
+                       help='Currency the bulk file quotes its rates against (default: EUR)')
+    parser.add_argument('--from-currency', default='USD',
+                       help='Source currency (default: USD)')
+    parser.add_argument('--to-currency', default='INR',
+                       help='Target currency (default: INR)')
+    parser.add_argument('--output', default=None,
+                       help='Output filename (default: auto-generated)')
+    parser.add_argument('--format', default='xlsx', choices=sorted(OUTPUT_WRITERS),
+                       help='Output format (default: xlsx)')
+    parser.add_argument('--if-changed', action='store_true',
+                       help='Use a stable file name and only rewrite it when a rate changed (hashes kept in FILE.manifest.json)')
+    parser.add_argument('--excel-write-only', action='store_true',
+                       help='Stream the xlsx through a write-only workbook (automatic for large frames)')
+    parser.add_argument('--analytics', action='store_true',
+                       help='Add MoM/YoY change, rolling mean, volatility and annual means per pair (extra sheets for xlsx, extra columns otherwise)')
+    parser.add_argument('--analytics-window', type=int, default=3,
+                       help='Months in the --analytics rolling mean (default: 3)')
+    parser.add_argument('--volatility-window', type=int, default=12,
+                       help='Monthly changes in the --analytics rolling volatility (default: 12)')
+    parser.add_argument('--current-year-only', action='store_true',
+                       help='Fetch only current year data')
+    parser.add_argument('--pairs', default=None,
+                       help='Comma separated FROM:TO pairs, e.g. USD:INR,EUR:GBP (overrides --from/--to-currency)')
+    parser.add_argument('--pairs-file', default=None,
+                       help='File with one FROM:TO pair per line')
+    parser.add_argument('--currencies', default=None,
+                       help='Comma separated currencies; scrape each against --anchor and derive all cross rates')
+    parser.add_argument('--anchor', default='USD',
+                       help='Anchor currency for --currencies (default: USD)')
+    parser.add_argument('--drift-sample', type=int, default=0,
+                       help='Also scrape this many derived pairs directly and report the drift (default: 0)')
+    parser.add_argument('--workers', type=int, default=1,
+                       help='Number of years fetched concurrently (default: 1)')
+    parser.add_argument('--rate', type=float, default=None,
+                       help='Max requests per second to x-rates.com, lowered on 429/503 (default: 1.0)')
+    parser.add_argument('--burst', type=int, default=2,
+                       help='Requests allowed back to back before --rate applies (default: 2)')
+    parser.add_argument('--no-cache', action='store_true',
+                       help='Do not read or write the on-disk response cache')
+    parser.add_argument('--cache-dir', default='.xrates_cache',
+                       help='Directory for cached year pages (default: .xrates_cache)')
+    parser.add_argument('--cache-ttl', type=float, default=6,
+                       help='Hours before the current year is revalidated (default: 6)')
+    parser.add_argument('--refresh-year', type=int, action='append', default=[],
+                       help='Revalidate this year even if cached (can be repeated)')
+    parser.add_argument('--stream', action='store_true',
+                       help='Stop downloading each page once the rate list has been received (not with --record, which keeps whole pages)')
+    parser.add_argument('--transport', default='requests', choices=['requests', 'httpx'],
+                       help='HTTP client: requests (HTTP/1.1, gzip) or httpx (HTTP/2, brotli/zstd; needs httpx[http2]) (default: requests)')
+    parser.add_argument('--pipeline-depth', type=int, default=2,
+                       help='With --workers 1, pages downloaded ahead while earlier ones are parsed; 0 disables (default: 2)')
+    archive = parser.add_mutually_exclusive_group()
+    archive.add_argument('--record', metavar='DIR', default=None,
+                       help='Save every downloaded page to a compressed, content-addressed archive in DIR')
+    archive.add_argument('--replay', metavar='DIR', default=None,
+                       help='Answer every page from an archive made with --record instead of the network')
+    parser.add_argument('--update', action='store_true',
+                       help='Only fetch years missing from --store or still changing, and merge them in')
+    parser.add_argument('--store', default='exchange_rates.sqlite',
+                       help='SQLite rate store used by --update (default: exchange_rates.sqlite)')
+    parser.add_argument('--daily', action='store_true',
+                       help='Scrape daily historical rates (one page per source currency and day)')
+    parser.add_argument('--daily-queue', default='daily_jobs.sqlite',
+                       help='Persistent job queue for --daily; re-run to resume (default: daily_jobs.sqlite)')
+    parser.add_argument('--metrics-jsonl', default=None,
+                       help='Write per-phase timing spans and counters as JSON lines to this file')
+    parser.add_argument('--metrics-prom', default=None,
+                       help='Write phase timings and counters as a Prometheus textfile to this file')
+    parser.add_argument('--host', default='127.0.0.1',
+                       help='Address for serve (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8080,
+                       help='Port for serve (default: 8080)')
+    parser.add_argument('--lru-size', type=int, default=1024,
+                       help='Year pages kept in memory by serve (default: 1024)')
+    parser.add_argument('--refresh-interval', type=float, default=60,
+                       help='Minutes between background refreshes of the current year in serve, 0 to disable (default: 60)')
+    parser.add_argument('--max-retries', type=int, default=4,
+                       help='Retries per page on timeouts, 429 and 5xx responses (default: 4)')
+    parser.add_argument('--backoff', type=float, default=1.0,
+                       help='Base backoff in seconds, doubled on every retry (default: 1.0)')
+    parser.add_argument('--max-retry-after', type=float, default=600,
+                       help='Fail a page instead of waiting when Retry-After asks for longer than this many seconds (default: 600)')
+    
+    args = parser.parse_args()
+    if args.analytics_window < 1 or args.volatility_window < 2:
+        parser.error("--analytics-window must be at least 1 and --volatility-window at least 2")
+    
+    # Initialize scraper
+    # --rate or workers replace the fixed pauses with the limiter. Otherwise,
+    # with retries on, a limiter at the pauses' own pace sits on top of them
+    # so 429/503 can slow the run down but never speed it up
+    rate_limiter = None
+    pauses = None
+    if args.rate or args.workers > 1:
+        rate_limiter = RateLimiter(args.rate or 1.0, args.burst)
+    elif args.max_retries > 0:
+        rate_limiter = RateLimiter(PAUSED_RATE)
+        pauses = True
+    # Recording fetches every page and replaying re-parses every page, so
+    # both bypass the parsed-page cache
+    cache = None if args.no_cache or args.record or args.replay else ResponseCache(args.cache_dir, args.cache_ttl * 3600)
+    retry_policy = RetryPolicy(args.max_retries, args.backoff, max_retry_after=args.max_retry_after)
+    try:
+        scraper = XRatesScraper(args.base_url, rate_limiter=rate_limiter, pool_size=max(10, args.workers),
+                                cache=cache, refresh_years=args.refresh_year, stream=args.stream,
+                                retry_policy=retry_policy, metrics=Metrics(keep_events=bool(args.metrics_jsonl)),
+                                pipeline_depth=args.pipeline_depth,
+                                record_archive=HttpArchive(args.record) if args.record else None,
+                                replay_archive=HttpArchive(args.replay) if args.replay else None,
+                                source=BulkFileSource(args.bulk_file, args.bulk_base) if args.bulk_file else None,
+                                transport=args.transport, pauses=pauses)
+    except ImportError as e:
+        print(f"✗ {e}")
+        sys.exit(1)
+    
+    try:
+        if args.command == 'serve':
+            serve_main(scraper, args)
+        else:
+            scrape_main(scraper, args)
+    finally:
+        write_metrics(scraper, args)
+
 if __name__ == "__main__":    
     main()